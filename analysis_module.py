@@ -1,206 +1,1443 @@
 # analysis_module.py
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
-import statsmodels.formula.api as smf
 import traceback
+import importlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 
-def get_stock_data(ticker, start_date, end_date):
-    # ... (mesma função de antes) ...
+import data_providers
+import info_cache
+import instrumentation
+import price_cache
+import price_store
+import quantile_sketch
+
+# Dependências pesadas carregadas só no primeiro uso: o núcleo numérico (regressão, canais,
+# projeção) importa sem yfinance e sem statsmodels, o que encurta a partida do app e de
+# cada processo do lote. O yfinance fica em data_providers.YahooProvider;
+# analysis_module.sm / .smf continuam acessíveis (e substituíveis).
+_LAZY_MODULES = {
+    'sm': 'statsmodels.api',
+    'smf': 'statsmodels.formula.api',
+}
+
+
+def _lazy_module(name):
+    module = globals().get(name)
+    if module is None:
+        module = globals()[name] = importlib.import_module(_LAZY_MODULES[name])
+    return module
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        return _lazy_module(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _clean_close_data(data, ticker):
+    """
+    Normaliza o DataFrame retornado pelo downloader para uma única coluna 'Close'
+    ordenada por data e sem NaNs. Retorna None se a coluna de fechamento não existir.
+    Um DataFrame vazio não é erro aqui (ex.: intervalo de complemento sem pregões).
+    """
+    if data is None or data.empty:
+        return pd.DataFrame({'Close': pd.Series(dtype='float64')}, index=pd.DatetimeIndex([], name='Date'))
+
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    if 'Close' not in data.columns:
+         if 'Adj Close' in data.columns: data['Close'] = data['Adj Close']
+         else:
+             print(f"Erro ao buscar dados históricos: Coluna 'Close' não encontrada nos dados baixados após achatar colunas para '{ticker}'.")
+             return None
+
+    initial_rows_before_dropna = len(data)
+    data = data.dropna(subset=['Close'])
+    if len(data) < initial_rows_before_dropna:
+        print(f"Aviso ao buscar dados históricos: {initial_rows_before_dropna - len(data)} linhas removidas devido a NaNs na coluna 'Close' para '{ticker}'.")
+
+    data.index = pd.to_datetime(data.index)
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    data = data.sort_index()
+
+    return data[['Close']]
+
+
+def get_stock_data(ticker, start_date, end_date, downloader=None, use_cache=True, cache_dir=None,
+                   provider=None, raise_errors=False):
+    """
+    Busca o histórico de fechamento de um ticker no intervalo [start_date, end_date).
+    Com use_cache=True a série limpa fica num arquivo Parquet local por ticker e apenas
+    os trechos que faltam (antes do início ou depois do fim já cobertos) são baixados,
+    cada um com um pregão de sobreposição: se o provedor reajustou a série (desdobramento,
+    provento), o cache é descartado e o período é baixado de novo inteiro.
+    provider é a fonte dos dados (padrão: data_providers.get_default_provider()); provedores
+    locais não passam pelo cache Parquet. downloader substitui só a função de download
+    (ex.: dados sintéticos em benchmarks).
+    Em caso de erro imprime a mensagem e retorna None; com raise_errors=True levanta
+    data_providers.DataSourceError (ou TickerNotFoundError) no lugar.
+    """
+    provider = provider or data_providers.get_default_provider()
+    if downloader is None:
+        downloader = provider.fetch_history
+        use_cache = use_cache and provider.cacheable
     try:
-        data = yf.download(ticker, start=start_date, end=end_date)
-        if data.empty:
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize()
+
+        if use_cache:
+            # Armazenamento colunar compartilhado (LOG_RET_PRICE_STORE): recorte sem leitura nem download
+            store = price_store.open_price_store()
+            if store is not None and ticker in store and store.covers(ticker, start, end):
+                with instrumentation.span('store_read'):
+                    data = store.stock_data(ticker, start, end)
+                if not data.empty:
+                    return data
+
+        cached, covered_start, covered_end, fetched_at = (None, None, None, None)
+        if use_cache:
+            with instrumentation.span('cache_read'):
+                cached, covered_start, covered_end, fetched_at = price_cache.load_cached_close(ticker, cache_dir)
+
+        data = cached
+        fetched_any = False
+        for range_start, range_end in price_cache.missing_ranges(covered_start, covered_end, start, end):
+            fetch_start, fetch_end, overlap_date = price_cache.overlap_range(cached, covered_start, covered_end, range_start, range_end)
+            try:
+                with instrumentation.span('download'):
+                    raw_data = downloader(ticker, fetch_start, fetch_end)
+                with instrumentation.span('cleaning'):
+                    new_data = _clean_close_data(raw_data, ticker)
+            except Exception as e:
+                if cached is None:
+                    raise
+                # Com cache disponível, uma falha no complemento não impede a análise
+                print(f"Aviso: falha ao complementar o cache de '{ticker}' entre {range_start.date()} e {range_end.date()}: {e}")
+                continue
+            if new_data is None:
+                if raise_errors:
+                    raise data_providers.DataSourceError(f"coluna 'Close' não encontrada nos dados de '{ticker}'", ticker=ticker, provider=provider.name)
+                return None
+            if price_cache.adjustment_changed(cached, new_data, overlap_date):
+                # Cache noutra base de ajuste: misturá-lo com os dados novos criaria saltos falsos
+                print(f"Aviso: o provedor reajustou a série de '{ticker}' (desdobramento ou provento); o cache será baixado novamente.")
+                price_cache.discard_cached_close(ticker, cache_dir)
+                return get_stock_data(ticker, start_date, end_date, downloader, use_cache, cache_dir, provider, raise_errors)
+            data = price_cache.merge_close(data, new_data)
+            # A cobertura só avança sobre o que o download comprovou (veja price_cache.proven_range)
+            proven = price_cache.proven_range(range_start, range_end, new_data,
+                                              head=covered_start is not None and range_end <= covered_start)
+            if proven is None:
+                continue
+            covered_start = proven[0] if covered_start is None else min(covered_start, proven[0])
+            covered_end = proven[1] if covered_end is None else max(covered_end, proven[1])
+            fetched_any = True
+
+        if use_cache and fetched_any and data is not None and not data.empty:
+            covered_end = min(covered_end, max(price_cache.coverage_end_limit(), covered_start))
+            with instrumentation.span('cache_write'):
+                price_cache.save_cached_close(ticker, data, covered_start, covered_end, cache_dir, fetched_at)
+
+        if data is not None:
+            data = data[(data.index >= start) & (data.index < end)]
+
+        if data is None or data.empty:
+            if raise_errors:
+                raise data_providers.DataSourceError(f"nenhum dado encontrado para o ticker '{ticker}' no período especificado", ticker=ticker, provider=provider.name)
             print(f"Erro ao buscar dados históricos: Nenhum dado encontrado para o ticker '{ticker}' no período especificado.")
             return None
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.get_level_values(0)
-        if 'Close' not in data.columns:
-             if 'Adj Close' in data.columns: data['Close'] = data['Adj Close']
-             else:
-                 print(f"Erro ao buscar dados históricos: Coluna 'Close' não encontrada nos dados baixados após achatar colunas para '{ticker}'.")
-                 return None
-
-        initial_rows_before_dropna = len(data)
-        data = data.dropna(subset=['Close'])
-        if len(data) < initial_rows_before_dropna:
-            print(f"Aviso ao buscar dados históricos: {initial_rows_before_dropna - len(data)} linhas removidas devido a NaNs na coluna 'Close' para '{ticker}'.")
-
-        if data.empty:
-             print(f"Erro ao buscar dados históricos: Nenhum dado válido para o ticker '{ticker}' no período especificado após tratamento de NaNs.")
-             return None
-
-        data.index = pd.to_datetime(data.index)
-        data = data.sort_index()
 
         return data[['Close']]
 
+    except data_providers.DataSourceError as e:
+        if raise_errors:
+            raise
+        print(f"Erro ao buscar dados históricos para o ticker '{ticker}': {e}")
+        return None
     except Exception as e:
+        if raise_errors:
+            raise data_providers.DataSourceError(f"erro inesperado ao obter dados históricos para '{ticker}': {e}", ticker=ticker, provider=provider.name) from e
         print(f"Erro inesperado ao obter dados históricos para o ticker '{ticker}': {e}")
         traceback.print_exc()
         return None
 
-def get_stock_info(ticker):
+def get_stock_info(ticker, use_cache=True, db_path=None, provider=None, raise_errors=False):
     # ... (mesma função de antes) ...
     """
-    Busca informações adicionais para um ticker no Yahoo Finance.
+    Busca informações adicionais para um ticker no provedor (padrão: Yahoo Finance).
+    Com use_cache=True retorna só os campos usados (info_cache.FIELD_TTLS), lidos de um
+    cache SQLite local enquanto válidos; se a busca falhar, os valores vencidos do cache
+    são retornados no lugar. Com use_cache=False retorna o dict completo do provedor.
+    Sem cache para recorrer, uma falha imprime o erro e retorna None, ou levanta
+    data_providers.DataSourceError com raise_errors=True.
     """
+    provider = provider or data_providers.get_default_provider()
+    cached, stale = ({}, None)
+    if use_cache:
+        with instrumentation.span('info_cache_read'):
+            cached, stale = info_cache.load_info(ticker, db_path)
+        if cached and not stale:
+            return cached
+
     try:
-        ticker_obj = yf.Ticker(ticker)
-        info = ticker_obj.info
-        return info
+        with instrumentation.span('info'):
+            info = provider.fetch_info(ticker)
     except Exception as e:
+        if cached:
+            print(f"Aviso: falha ao atualizar informações para o ticker '{ticker}' ({e}). Usando o cache.")
+            return cached
+        if raise_errors:
+            if isinstance(e, data_providers.DataSourceError):
+                raise
+            raise data_providers.DataSourceError(f"erro ao obter informações para '{ticker}': {e}", ticker=ticker, provider=provider.name) from e
         print(f"Erro ao obter informações para o ticker '{ticker}': {e}")
         return None
 
+    if not use_cache:
+        return info
+    if not info:
+        return cached or None
+    info_cache.save_info(ticker, info, db_path)
+    return info_cache.project_info(info)
+
+
+# Pool de threads compartilhado para as chamadas de rede (histórico e informações)
+# e tempo máximo de espera por chamada, em segundos. Configuráveis por variáveis de ambiente.
+FETCH_TIMEOUT = float(os.environ.get('LOG_RET_FETCH_TIMEOUT', 60))
+_FETCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('LOG_RET_FETCH_WORKERS', 8)),
+    thread_name_prefix='log_ret_fetch'
+)
+_pending_info = {}
+_pending_info_lock = threading.RLock()
 
-# Retorna o DataFrame para plotagem, componentes para projeção E dados de resíduos E taxa de crescimento
-def calculate_log_regression(data):
+
+def fetch_stock_info_async(ticker):
     """
-    Calcula a regressão logarítmica, o canal de regressão baseado nos resíduos máximos/mínimos,
-    e a taxa de crescimento anualizada.
-    Retorna o DataFrame para plotagem, componentes para projeção E dados de resíduos E taxa de crescimento.
+    Dispara get_stock_info em segundo plano e retorna o Future correspondente.
+    Pedidos simultâneos para o mesmo ticker compartilham a mesma chamada de rede.
+    """
+    with _pending_info_lock:
+        future = _pending_info.get(ticker)
+        if future is None:
+            future = _FETCH_EXECUTOR.submit(instrumentation.bind(get_stock_info), ticker)
+            _pending_info[ticker] = future
+            future.add_done_callback(lambda _: _forget_pending_info(ticker, future))
+        return future
+
+
+def _forget_pending_info(ticker, future):
+    with _pending_info_lock:
+        if _pending_info.get(ticker) is future:
+            del _pending_info[ticker]
+
+
+def _call_with_timeout(description, timeout, function, *args):
+    """
+    Executa function(*args) no pool de rede e espera no máximo timeout segundos.
+    Em caso de estouro retorna None; a chamada continua em segundo plano até terminar.
     """
-    # Adicionado None extra no retorno de erro
+    future = _FETCH_EXECUTOR.submit(instrumentation.bind(function), *args)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        print(f"Erro: tempo limite de {timeout:.0f}s excedido ao {description}.")
+        return None
+
+
+def fetch_many(tickers, start_date, end_date, include_info=False, max_workers=8, timeout=None):
+    """
+    Busca histórico (e opcionalmente informações) de vários tickers em paralelo,
+    com no máximo max_workers chamadas simultâneas.
+    timeout limita o tempo total do lote: tickers não concluídos a tempo ficam com None.
+    Retorna {ticker: {'stock_data': DataFrame ou None, 'stock_info': dict ou None}}.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    results = {ticker: {'stock_data': None, 'stock_info': None} for ticker in tickers}
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='log_ret_batch')
+    try:
+        futures = {}
+        for ticker in tickers:
+            futures[executor.submit(get_stock_data, ticker, start_date, end_date)] = (ticker, 'stock_data')
+            if include_info:
+                futures[executor.submit(get_stock_info, ticker)] = (ticker, 'stock_info')
+
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            ticker, field = futures[future]
+            results[ticker][field] = future.result()
+        if not_done:
+            late = sorted({futures[future][0] for future in not_done})
+            print(f"Aviso: tempo limite excedido na busca em lote para {', '.join(late)}.")
+            for future in not_done:
+                future.cancel()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def warm_stock_info(tickers, max_workers=8, force=False):
+    """
+    Preenche o cache de informações para uma lista de tickers, em paralelo.
+    Sem force só busca os tickers com algum campo vencido ou ausente.
+    Retorna {ticker: informações projetadas ou None}.
+    """
+    tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    if not force:
+        tickers = [ticker for ticker in tickers if info_cache.load_info(ticker)[1]]
+    fetch = _refresh_stock_info if force else get_stock_info
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='log_ret_info') as executor:
+        return dict(zip(tickers, executor.map(fetch, tickers)))
+
+
+def _refresh_stock_info(ticker):
+    """Busca o .info ignorando a validade do cache e grava os campos projetados."""
+    info = get_stock_info(ticker, use_cache=False)
+    if not info:
+        return None
+    info_cache.save_info(ticker, info)
+    return info_cache.project_info(info)
+
+
+# Dias de negociação por ano usados para anualizar a inclinação da regressão
+TRADING_DAYS_PER_YEAR = 252
+
+
+class LinearTrendModel:
+    """
+    Modelo leve da reta log_close = Intercept + time * inclinação.
+    Expõe params e predict com a mesma interface usada do resultado do statsmodels,
+    para que project_log_channel aceite qualquer um dos dois.
+    """
+    __slots__ = ('params',)
+
+    def __init__(self, intercept, slope):
+        self.params = pd.Series({'Intercept': intercept, 'time': slope})
+
+    def predict(self, exog):
+        time = exog['time'] if isinstance(exog, (pd.DataFrame, dict)) else exog
+        return self.params['Intercept'] + self.params['time'] * np.asarray(time, dtype=np.float64)
+
+
+def _trend_from_sums(n, sum_y, sum_ty):
+    """
+    Inclinação e intercepto da regressão de y em t = 0, 1, ..., n-1 a partir de Σy e Σty.
+    Como t é igualmente espaçado, Σt e Σt² têm forma fechada e não precisam ser acumulados.
+    Aceita escalares ou arrays NumPy (uma regressão por elemento).
+    """
+    t_mean = (n - 1) / 2
+    sxx = n * (n * n - 1) / 12
+    slope = (sum_ty - t_mean * sum_y) / sxx
+    intercept = sum_y / n - slope * t_mean
+    return slope, intercept
+
+
+def _annualized_growth_rate(slope):
+    """Converte a inclinação diária em log para taxa de crescimento anual (%)."""
+    return (np.exp(slope * TRADING_DAYS_PER_YEAR) - 1) * 100
+
+
+def fit_log_trend(log_close):
+    """
+    Ajusta a tendência linear de log_close (array 1-D float64) por mínimos quadrados em forma fechada.
+    Retorna inclinação, intercepto, reta ajustada, resíduos e os resíduos máximo e mínimo.
+    """
+    n = len(log_close)
+    fitted = np.arange(n, dtype=np.float64)
+    slope, intercept = _trend_from_sums(n, log_close.sum(), fitted @ log_close)
+    # Reaproveita o vetor de tempo como buffer da reta ajustada
+    fitted *= slope
+    fitted += intercept
+    residuals = log_close - fitted
+    return slope, intercept, fitted, residuals, residuals.max(), residuals.min()
+
+
+def _fit_log_trend_statsmodels(log_close):
+    """Ajuste de referência com statsmodels (mesmo contrato de fit_log_trend, mais o modelo)."""
+    df_fit = pd.DataFrame({'log_close': log_close, 'time': np.arange(len(log_close))})
+    model = _lazy_module('smf').ols('log_close ~ time', data=df_fit).fit()
+    fitted = model.predict(df_fit['time']).to_numpy()
+    residuals = log_close - fitted
+    return model, model.params['time'], model.params['Intercept'], fitted, residuals, residuals.max(), residuals.min()
+
+
+def _prepare_log_close(data):
+    """
+    Extrai a série 'Close' ordenada por data e o seu log (float64), removendo valores
+    cujo log não é finito. Retorna (close, log_close) ou None se restarem menos de 2 pontos.
+    data pode ser o DataFrame de get_stock_data ou diretamente uma Series de fechamentos
+    (ex.: a vista sem cópia de PriceStore.series).
+    """
+    if isinstance(data, pd.Series):
+        data = data.to_frame('Close')
     if data is None or data.empty or 'Close' not in data.columns:
         print("Erro: Dados inválidos ou vazios para calcular a regressão.")
-        return None, None, None, None, None, None, None, None
+        return None
 
-    df = data.copy()
-    df['log_close'] = np.log(df['Close'] + 1e-9)
-    df['time'] = np.arange(len(df))
+    close = data['Close']
+    if not close.index.is_monotonic_increasing:
+        close = close.sort_index()
 
-    initial_rows = len(df)
-    df_clean = df.replace([np.inf, -np.inf], np.nan).dropna(subset=['log_close', 'time']).copy()
-    df_clean.index = pd.to_datetime(df_clean.index)
-    df_clean = df_clean.sort_index()
+    initial_rows = len(close)
+    log_close = np.log(close.to_numpy(dtype=np.float64) + 1e-9)
+    valid = np.isfinite(log_close)
+    if not valid.all():
+        close = close[valid]
+        log_close = log_close[valid]
 
     # Mínimo de pontos necessários para OLS (2 parâmetros: intercepto e coef. do tempo)
-    # Adicionado None extra no retorno de erro
-    if len(df_clean) < 2:
-        print(f"Erro: Dados insuficientes para calcular regressão após limpeza. Mínimo de 2 pontos necessários, encontrados {len(df_clean)}.")
-        return None, None, None, None, None, None, None, None
+    if len(log_close) < 2:
+        print(f"Erro: Dados insuficientes para calcular regressão após limpeza. Mínimo de 2 pontos necessários, encontrados {len(log_close)}.")
+        return None
+
+    if len(log_close) < initial_rows:
+        print(f"Aviso: {initial_rows - len(log_close)} linhas removidas durante a limpeza após transformação logarítmica.")
+
+    return close, log_close
+
+
+def _percentile_rank(values, value):
+    """Percentil de value entre values: % abaixo dele mais metade dos empates."""
+    below = np.count_nonzero(values < value)
+    equal = np.count_nonzero(values == value)
+    return 100.0 * (below + 0.5 * equal) / len(values)
+
+
+# Bins da contagem intermediária do KDE: o custo fica O(N + bins · grade), sem
+# avaliar o kernel em cada resíduo
+_KDE_BINS = 2048
+
+
+def _binned_gaussian_kde(values, grid_points):
+    """
+    KDE gaussiano de values na grade [min, max] com grid_points pontos, aproximado por
+    contagens em _KDE_BINS bins finos (erro desprezível diante da banda de Scott).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    low, high = values.min(), values.max()
+    grid = np.linspace(low, high, grid_points)
+    bandwidth = values.std() * len(values) ** (-1 / 5)
+    if bandwidth == 0 or high == low:
+        return grid, np.zeros(grid_points)
+    counts, edges = np.histogram(values, bins=_KDE_BINS, range=(low, high))
+    centers = (edges[:-1] + edges[1:]) / 2
+    occupied = counts > 0
+    z = (grid[:, None] - centers[occupied][None, :]) / bandwidth
+    density = np.exp(-0.5 * z * z) @ counts[occupied] / (len(values) * bandwidth * np.sqrt(2 * np.pi))
+    return grid, density
+
+
+# Quantis padrão das bandas de quantis dos resíduos: alternativa aos canais de
+# resíduo máximo/mínimo que não depende de um único pregão extremo
+DEFAULT_BAND_QUANTILES = (0.01, 0.05, 0.95, 0.99)
+
+
+def _band_column(quantile):
+    """Nome da coluna da banda de um quantil (ex.: 0.05 -> 'band_p5')."""
+    return f"band_p{quantile * 100:g}"
+
+
+def _check_quantiles(quantiles):
+    """Quantis como array float64 1-D; ValueError se algum estiver fora de [0, 1]."""
+    checked = np.asarray(quantiles, dtype=np.float64)
+    if checked.ndim != 1 or np.any(~((checked >= 0) & (checked <= 1))):
+        raise ValueError(f"Quantis inválidos: {np.atleast_1d(quantiles).tolist()}. Use valores entre 0 e 1.")
+    return checked
 
-    if len(df_clean) < initial_rows:
-        print(f"Aviso: {initial_rows - len(df_clean)} linhas removidas durante a limpeza após transformação logarítmica.")
-        df_clean.loc[:, 'time'] = np.arange(len(df_clean))
 
-    # Inicializa a taxa de crescimento como None, caso a regressão falhe
-    annualized_growth_rate = None
+def _partition_quantiles(values, quantiles, axis=-1):
+    """
+    Quantis de values ao longo de axis com a mesma interpolação linear de np.quantile,
+    mas por seleção (np.partition só nas posições necessárias), sem ordenar tudo.
+    Os quantis ficam no último eixo do resultado.
+    """
+    quantiles = _check_quantiles(quantiles)
+    n = values.shape[axis]
+    positions = quantiles * (n - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, n - 1)
+    partitioned = np.partition(values, np.unique(np.concatenate((lower, upper))), axis=axis)
+    lower_values = np.moveaxis(np.take(partitioned, lower, axis=axis), axis, -1).astype(np.float64)
+    upper_values = np.moveaxis(np.take(partitioned, upper, axis=axis), axis, -1).astype(np.float64)
+    return lower_values + (upper_values - lower_values) * (positions - lower)
+
+
+# Colunas de canal do DataFrame de plotagem e o deslocamento de cada uma em log,
+# como fração de (resíduo máximo, resíduo mínimo)
+_CHANNEL_COLUMNS = {
+    'upper_outer_channel': (1.0, 0.0),
+    'lower_outer_channel': (0.0, 1.0),
+    'upper_inner_channel': (0.5, 0.0),
+    'lower_inner_channel': (0.0, 0.5),
+}
+
+
+# Largura (em log) abaixo da qual o canal é considerado nulo: numa série constante os
+# resíduos máximo e mínimo diferem só por ruído de ponto flutuante
+_MIN_CHANNEL_WIDTH = 1e-12
+
+
+def _channel_position(log_residual, min_log_residual, max_log_residual):
+    """(resíduo - mínimo) / (máximo - mínimo), com NaN onde o canal tem largura nula (escalar ou array)."""
+    width = np.subtract(max_log_residual, min_log_residual)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        position = np.where(width > _MIN_CHANNEL_WIDTH, np.subtract(log_residual, min_log_residual) / width, np.nan)
+    return position if position.ndim else float(position)
+
+
+class LogChannelResult:
+    """
+    Resultado compacto de calculate_log_regression.
+    Guarda apenas o índice de datas, os parâmetros do ajuste e um único array de resíduos
+    (float64 ou float32); fechamento, linha central e canais são derivados sob demanda
+    a partir de intercepto + inclinação * t (+ resíduo ou deslocamento do canal).
+    """
+    __slots__ = (
+        'index', 'slope', 'intercept', 'residuals', 'max_log_residual', 'min_log_residual',
+        'current_actual_price', '_model', '_residual_stats',
+    )
+
+    def __init__(self, index, slope, intercept, residuals, max_log_residual, min_log_residual, current_actual_price, model=None):
+        self.index = index
+        self.slope = float(slope)
+        self.intercept = float(intercept)
+        self.residuals = residuals
+        self.max_log_residual = float(max_log_residual)
+        self.min_log_residual = float(min_log_residual)
+        self.current_actual_price = float(current_actual_price)
+        self._model = model
+        # Estatísticas dos resíduos já calculadas (histograma, percentil, KDE, quantis), por parâmetros
+        self._residual_stats = {}
+
+    def __len__(self):
+        return len(self.residuals)
+
+    @property
+    def model(self):
+        """Modelo para project_log_channel (o resultado do statsmodels, se foi esse o engine)."""
+        return self._model if self._model is not None else LinearTrendModel(self.intercept, self.slope)
+
+    @property
+    def annualized_growth_rate(self):
+        return _annualized_growth_rate(self.slope)
+
+    @property
+    def current_log_residual(self):
+        return float(self.residuals[-1])
+
+    @property
+    def channel_position(self):
+        """
+        Posição do último fechamento no canal: 0 no canal exterior inferior, 1 no superior.
+        NaN se o canal tem largura nula (série constante), como em calculate_log_regression_batch.
+        """
+        return _channel_position(self.current_log_residual, self.min_log_residual, self.max_log_residual)
+
+    @property
+    def log_residuals(self):
+        return pd.Series(self.residuals, index=self.index, name='log_residuals')
+
+    def _memoized(self, key, compute):
+        value = self._residual_stats.get(key)
+        if value is None:
+            value = self._residual_stats[key] = compute()
+        return value
+
+    @property
+    def residual_percentile(self):
+        """Percentil (0 a 100) do resíduo atual na distribuição histórica dos resíduos."""
+        return self._memoized('percentile', lambda: _percentile_rank(self.residuals, self.current_log_residual))
+
+    def residual_histogram(self, bins=50):
+        """
+        Contagens e limites dos bins do histograma dos resíduos (np.histogram), calculados
+        uma vez por número de bins. O tamanho não depende do comprimento do histórico.
+        """
+        return self._memoized(('histogram', bins), lambda: np.histogram(self.residuals, bins=bins))
+
+    def residual_kde(self, grid_points=200):
+        """
+        Densidade dos resíduos (KDE gaussiano, banda pela regra de Scott) numa grade fixa de
+        grid_points pontos entre o menor e o maior resíduo. Retorna (grade, densidade).
+        """
+        return self._memoized(('kde', grid_points), lambda: _binned_gaussian_kde(self.residuals, grid_points))
+
+    def residual_quantiles(self, quantiles=DEFAULT_BAND_QUANTILES):
+        """
+        Quantis dos resíduos em log ({quantil: resíduo}), por seleção com np.partition,
+        calculados uma vez por conjunto de quantis.
+        """
+        quantiles = tuple(float(quantile) for quantile in quantiles)
+        return self._memoized(
+            ('quantiles', quantiles),
+            lambda: dict(zip(quantiles, _partition_quantiles(self.residuals, quantiles).tolist()))
+        )
+
+    def log_predicted_close(self, rows=None):
+        """Linha central em log nas posições rows (todas, se None)."""
+        time = np.arange(len(self.residuals), dtype=np.float64)
+        if rows is not None:
+            time = time[rows]
+        return self.intercept + self.slope * time
+
+    @property
+    def close(self):
+        close = np.exp(self.log_predicted_close() + self.residuals) - 1e-9
+        return pd.Series(close, index=self.index, name='Close')
+
+    def to_frame(self, rows=None, band_quantiles=None):
+        """
+        DataFrame de plotagem (Close, predicted_close e os quatro canais) nas posições rows
+        (slice ou array de posições; todas, se None). É montado a cada chamada e não fica guardado.
+        band_quantiles acrescenta as bandas de quantis dos resíduos (colunas band_p1, band_p95, ...).
+        """
+        with instrumentation.span('channels'):
+            log_predicted_close = self.log_predicted_close(rows)
+            residuals = self.residuals if rows is None else self.residuals[rows]
+            predicted_close = np.exp(log_predicted_close)
+            frame = {
+                'Close': np.exp(log_predicted_close + residuals) - 1e-9,
+                'predicted_close': predicted_close,
+            }
+            for column, (max_weight, min_weight) in _CHANNEL_COLUMNS.items():
+                frame[column] = predicted_close * np.exp(max_weight * self.max_log_residual + min_weight * self.min_log_residual)
+            if band_quantiles is not None:
+                for quantile, log_residual in self.residual_quantiles(band_quantiles).items():
+                    frame[_band_column(quantile)] = predicted_close * np.exp(log_residual)
+            return pd.DataFrame(frame, index=self.index if rows is None else self.index[rows])
+
+
+# Retorna o resultado compacto da regressão (parâmetros, resíduos e canais derivados)
+def calculate_log_regression(data, engine='numpy', dtype=np.float64, band_quantiles=None):
+    """
+    Calcula a regressão logarítmica, o canal de regressão baseado nos resíduos máximos/mínimos,
+    e a taxa de crescimento anualizada.
+    Retorna um LogChannelResult ou None em caso de erro.
+    engine='numpy' usa a solução em forma fechada; engine='statsmodels' usa smf.ols (referência).
+    dtype=np.float32 guarda os resíduos em precisão simples (o ajuste é sempre em float64).
+    band_quantiles (ex.: DEFAULT_BAND_QUANTILES) já calcula os quantis dos resíduos em float64,
+    logo após o ajuste (veja LogChannelResult.residual_quantiles).
+    """
+    if engine not in ('numpy', 'statsmodels'):
+        raise ValueError(f"engine inválido: '{engine}'. Use 'numpy' ou 'statsmodels'.")
+    if band_quantiles is not None:
+        band_quantiles = tuple(_check_quantiles(band_quantiles).tolist())
+
+    with instrumentation.span('cleaning'):
+        prepared = _prepare_log_close(data)
+    if prepared is None:
+        return None
+    close, log_close = prepared
 
     try:
-        # 3. Ajustar o modelo nos dados LIMPOS
-        model = smf.ols('log_close ~ time', data=df_clean).fit()
+        # Ajustar o modelo nos dados LIMPOS (o tempo é renumerado de 0 a n-1)
+        with instrumentation.span('ols_fit'):
+            if engine == 'statsmodels':
+                model, beta_1, beta_0, _, log_residuals, max_log_residual, min_log_residual = _fit_log_trend_statsmodels(log_close)
+            else:
+                beta_1, beta_0, _, log_residuals, max_log_residual, min_log_residual = fit_log_trend(log_close)
+                model = None
+            if band_quantiles is not None:
+                band_log_residuals = _partition_quantiles(log_residuals, band_quantiles)
+
+        result = LogChannelResult(
+            index=pd.to_datetime(close.index),
+            slope=beta_1,
+            intercept=beta_0,
+            residuals=log_residuals.astype(dtype, copy=False),
+            max_log_residual=max_log_residual,
+            min_log_residual=min_log_residual,
+            current_actual_price=close.iloc[-1],
+            model=model,
+        )
+        if band_quantiles is not None:
+            result._residual_stats[('quantiles', band_quantiles)] = dict(zip(band_quantiles, band_log_residuals.tolist()))
+        return result
+
+    except Exception as e:
+        print(f"Erro no cálculo da regressão ou canais: {e}")
+        traceback.print_exc()
+        return None
+
+
+def get_stock_data_batch(tickers, start_date, end_date, downloader=None, provider=None):
+    """
+    Busca o fechamento de vários tickers com uma única chamada ao provedor (yf.download em lote
+    ou uma única leitura dos arquivos locais; veja data_providers).
+    Retorna um DataFrame largo (datas × tickers) com NaN onde o ticker não teve pregão,
+    ou None se nada for encontrado. Tickers sem nenhum dado aparecem como colunas só de NaN.
+    """
+    downloader = downloader or (provider or data_providers.get_default_provider()).fetch_history
+    tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    if not tickers:
+        print("Erro ao buscar dados históricos em lote: nenhum ticker informado.")
+        return None
+
+    try:
+        data = downloader(tickers, pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize())
+        if data is None or data.empty:
+            print("Erro ao buscar dados históricos em lote: Nenhum dado encontrado no período especificado.")
+            return None
+
+        if isinstance(data.columns, pd.MultiIndex):
+            price_level = data.columns.get_level_values(0)
+            if 'Close' in price_level:
+                prices = data['Close']
+            elif 'Adj Close' in price_level:
+                prices = data['Adj Close']
+            else:
+                print("Erro ao buscar dados históricos em lote: Coluna 'Close' não encontrada nos dados baixados.")
+                return None
+        elif 'Close' in data.columns and len(tickers) == 1:
+            prices = data[['Close']].set_axis(tickers, axis=1)
+        else:
+            print("Erro ao buscar dados históricos em lote: formato de colunas inesperado nos dados baixados.")
+            return None
+
+        prices = prices.reindex(columns=tickers).astype(np.float64)
+        prices.index = pd.to_datetime(prices.index)
+        if prices.index.tz is not None:
+            prices.index = prices.index.tz_localize(None)
+        prices = prices.sort_index().dropna(how='all')
+        prices.columns.name = 'Ticker'
+
+        missing = [ticker for ticker in tickers if prices[ticker].isna().all()]
+        if missing:
+            print(f"Aviso ao buscar dados históricos em lote: nenhum dado para {', '.join(missing)}.")
+
+        return prices
+
+    except Exception as e:
+        print(f"Erro inesperado ao obter dados históricos em lote: {e}")
+        traceback.print_exc()
+        return None
+
+
+def calculate_log_regression_batch(prices, band_quantiles=None):
+    """
+    Calcula o canal de regressão logarítmica de todas as colunas de um DataFrame largo
+    (datas × tickers) numa única passada vetorizada, com a mesma matemática de
+    calculate_log_regression: NaNs são ignorados e o tempo de cada ticker é renumerado
+    de 0 a n-1 sobre as suas observações válidas.
+    Retorna um DataFrame resumo (um ticker por linha) pronto para ordenação.
+    channel_position vai de 0 (canal exterior inferior) a 1 (canal exterior superior);
+    residual_percentile é o percentil (0 a 100) do resíduo atual no histórico do ticker.
+    band_quantiles acrescenta os quantis dos resíduos de cada ticker (colunas
+    band_p1_log_residual, ...), selecionados com np.partition sobre a matriz de resíduos já calculada.
+    Tickers com menos de 2 observações válidas ficam com NaN.
+    """
+    if band_quantiles is not None:
+        band_quantiles = _check_quantiles(band_quantiles)
+    if prices is None or prices.empty:
+        print("Erro: Dados inválidos ou vazios para calcular a regressão em lote.")
+        return None
+
+    values = prices.to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_prices = np.log(values + 1e-9)
+    valid = np.isfinite(log_prices)
+    n_obs = valid.sum(axis=0)
+
+    # Tempo por coluna: posição entre as observações válidas (igual à renumeração do caso individual)
+    time = np.cumsum(valid, axis=0, dtype=np.float64) - 1
+    log_prices[~valid] = 0.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept = _trend_from_sums(n_obs, log_prices.sum(axis=0), np.einsum('ij,ij->j', time, log_prices))
+        enough = n_obs >= 2
+        slope[~enough] = np.nan
+        intercept[~enough] = np.nan
 
-        # --- CALCULAR TAXA DE CRESCIMENTO ANUALIZADA ---
-        # O coeficiente de 'time' é a inclinação (beta_1)
-        beta_1 = model.params['time']
-        # Estimativa de 252 dias de negociação por ano
-        annualized_growth_factor = np.exp(beta_1 * 252)
-        annualized_growth_rate = (annualized_growth_factor - 1) * 100 # Em porcentagem
-        # --- FIM CALCULAR TAXA DE CRESCIMENTO ---
+        # Resíduos calculados no próprio buffer de tempo para não alocar outra matriz
+        residuals = time
+        residuals *= slope
+        residuals += intercept
+        np.subtract(log_prices, residuals, out=residuals)
 
+        max_log_residual = np.where(valid, residuals, -np.inf).max(axis=0)
+        min_log_residual = np.where(valid, residuals, np.inf).min(axis=0)
 
-        # Obter a linha central da regressão (em escala logarítmica) para os dados limpos
-        df_clean.loc[:, 'log_predicted_close'] = model.predict(df_clean['time'])
+        columns = np.arange(values.shape[1])
+        last_row = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+        current_log_residual = residuals[last_row, columns]
+        current_actual_price = values[last_row, columns]
+        last_date = prices.index[last_row].to_numpy()
 
-        df_clean.loc[:, 'log_residuals'] = df_clean['log_close'] - df_clean['log_predicted_close']
+        channel_position = _channel_position(current_log_residual, min_log_residual, max_log_residual)
+        # Percentil do resíduo atual entre os resíduos válidos de cada ticker
+        below = np.count_nonzero(valid & (residuals < current_log_residual), axis=0)
+        equal = np.count_nonzero(valid & (residuals == current_log_residual), axis=0)
+        residual_percentile = 100.0 * (below + 0.5 * equal) / n_obs
 
-        max_log_residual = df_clean['log_residuals'].max()
-        min_log_residual = df_clean['log_residuals'].min()
+    # O número de observações válidas varia por ticker, então a seleção é feita coluna a coluna
+    band_log_residuals = {}
+    if band_quantiles is not None:
+        quantile_values = np.full((values.shape[1], len(band_quantiles)), np.nan)
+        for column in np.flatnonzero(enough):
+            quantile_values[column] = _partition_quantiles(residuals[valid[:, column], column], band_quantiles)
+        band_log_residuals = {
+            f"{_band_column(quantile)}_log_residual": quantile_values[:, position]
+            for position, quantile in enumerate(band_quantiles.tolist())
+        }
 
-        df_clean.loc[:, 'log_upper_outer_channel'] = df_clean['log_predicted_close'] + max_log_residual
-        df_clean.loc[:, 'log_lower_outer_channel'] = df_clean['log_predicted_close'] + min_log_residual
-        df_clean.loc[:, 'log_upper_inner_channel'] = df_clean['log_predicted_close'] + max_log_residual / 2
-        df_clean.loc[:, 'log_lower_inner_channel'] = df_clean['log_predicted_close'] + min_log_residual / 2
+    no_data = n_obs == 0
+    last_date[no_data] = np.datetime64('NaT')
+    current_actual_price[no_data] = np.nan
+    for column in (max_log_residual, min_log_residual, current_log_residual, channel_position, residual_percentile):
+        column[~enough] = np.nan
 
-        df_clean.loc[:, 'predicted_close'] = np.exp(df_clean['log_predicted_close'])
-        df_clean.loc[:, 'upper_outer_channel'] = np.exp(df_clean['log_upper_outer_channel'])
-        df_clean.loc[:, 'lower_outer_channel'] = np.exp(df_clean['log_lower_outer_channel'])
-        df_clean.loc[:, 'upper_inner_channel'] = np.exp(df_clean['log_upper_inner_channel'])
-        df_clean.loc[:, 'lower_inner_channel'] = np.exp(df_clean['log_lower_inner_channel'])
+    summary = pd.DataFrame({
+        'n_obs': n_obs,
+        'last_date': last_date,
+        'current_actual_price': current_actual_price,
+        'slope': slope,
+        'intercept': intercept,
+        'annualized_growth_rate': _annualized_growth_rate(slope),
+        'max_log_residual': max_log_residual,
+        'min_log_residual': min_log_residual,
+        'current_log_residual': current_log_residual,
+        'channel_position': channel_position,
+        'residual_percentile': residual_percentile,
+        **band_log_residuals,
+    }, index=prices.columns)
+    summary.index.name = 'Ticker'
+    return summary
 
-        df_plot = df_clean[[
-            'Close',
-            'predicted_close',
-            'upper_outer_channel',
-            'lower_outer_channel',
-            'upper_inner_channel',
-            'lower_inner_channel'
-        ]]
 
-        log_residuals_series = df_clean['log_residuals']
+# Parâmetro k do sketch KLL das bandas de quantis em calculate_log_regression_streaming
+DEFAULT_SKETCH_K = 200
 
-        current_log_residual = log_residuals_series.iloc[-1] if not log_residuals_series.empty else None
-        current_actual_price = df_clean['Close'].iloc[-1] if not df_clean.empty else None
 
+def _log_close_chunks(chunks):
+    """Para cada pedaço de chunks(): (log do fechamento válido em float64, fechamentos válidos)."""
+    for chunk in chunks():
+        close = chunk['Close'] if isinstance(chunk, pd.DataFrame) else chunk
+        close = close.sort_index()
+        log_close = np.log(close.to_numpy(dtype=np.float64) + 1e-9)
+        valid = np.isfinite(log_close)
+        if valid.any():
+            yield log_close[valid], close[valid]
 
-        # Retornamos uma tupla com todos os resultados necessários, incluindo a taxa de crescimento
-        return df_plot, model, max_log_residual, min_log_residual, log_residuals_series, current_log_residual, current_actual_price, annualized_growth_rate
+
+def calculate_log_regression_streaming(chunks, band_quantiles=DEFAULT_BAND_QUANTILES, sketch_k=DEFAULT_SKETCH_K, seed=None):
+    """
+    Canal de regressão logarítmica de uma série longa demais para ficar inteira na memória.
+    chunks é uma função sem argumentos que devolve os pedaços da série em ordem cronológica
+    (DataFrames com 'Close' ou Series), ex.: lambda: pd.read_csv(caminho, index_col=0,
+    parse_dates=True, chunksize=500_000). Ela é chamada duas vezes: a 1ª passada acumula as
+    somas do OLS (n, Σy, Σty) e a 2ª calcula os resíduos de cada pedaço e os acumula num
+    quantile_sketch.KLLSketch, de modo que a memória fica limitada a um pedaço mais o sketch.
+    Inclinação, intercepto e resíduos máximo, mínimo e atual são exatos; os quantis
+    (band_p1_log_residual, ...) e residual_percentile são aproximados (erro de posto ~1,7 / sketch_k).
+    Retorna uma Series com os mesmos campos de uma linha de calculate_log_regression_batch, ou None.
+    """
+    band_quantiles = _check_quantiles(band_quantiles)
+    try:
+        n, sum_y, sum_ty = 0, 0.0, 0.0
+        for log_close, _ in _log_close_chunks(chunks):
+            time = np.arange(n, n + len(log_close), dtype=np.float64)
+            sum_y += float(log_close.sum())
+            sum_ty += float(time @ log_close)
+            n += len(log_close)
+        if n < 2:
+            print(f"Erro: Dados insuficientes para calcular regressão após limpeza. Mínimo de 2 pontos necessários, encontrados {n}.")
+            return None
+        slope, intercept = _trend_from_sums(n, sum_y, sum_ty)
+
+        sketch = quantile_sketch.KLLSketch(sketch_k, seed)
+        offset = 0
+        for log_close, close in _log_close_chunks(chunks):
+            time = np.arange(offset, offset + len(log_close), dtype=np.float64)
+            offset += len(log_close)
+            residuals = log_close - (intercept + slope * time)
+            sketch.update(residuals)
+            current_log_residual = float(residuals[-1])
+            current_actual_price = float(close.iloc[-1])
+            last_date = pd.Timestamp(close.index[-1])
+        if offset != n:
+            print(f"Erro: os pedaços mudaram entre as passadas ({n} e {offset} pontos válidos).")
+            return None
+
+        summary = {
+            'n_obs': n,
+            'last_date': last_date,
+            'current_actual_price': current_actual_price,
+            'slope': slope,
+            'intercept': intercept,
+            'annualized_growth_rate': _annualized_growth_rate(slope),
+            'max_log_residual': sketch.max,
+            'min_log_residual': sketch.min,
+            'current_log_residual': current_log_residual,
+            'channel_position': _channel_position(current_log_residual, sketch.min, sketch.max),
+            'residual_percentile': 100.0 * sketch.rank(current_log_residual),
+        }
+        for quantile, log_residual in zip(band_quantiles.tolist(), sketch.quantiles(band_quantiles).tolist()):
+            summary[f"{_band_column(quantile)}_log_residual"] = log_residual
+        return pd.Series(summary)
 
     except Exception as e:
-        print(f"Erro no cálculo da regressão ou canais para o ticker '{ticker}': {e}")
+        print(f"Erro no cálculo da regressão em pedaços: {e}")
         traceback.print_exc()
-        # Retornamos None para todos os valores em caso de erro
-        return None, None, None, None, None, None, None, None
+        return None
+
+
+def sweep_start_dates(data, start_dates=None, min_points=2):
+    """
+    Recalcula a regressão logarítmica para cada data de início possível (ou para a grade
+    start_dates), sempre até a última data de data.
+    Usa somas de sufixo de y e t*y: cada início custa O(1) e a varredura inteira O(N),
+    sem refazer o ajuste. min_points descarta janelas curtas demais.
+    Retorna um DataFrame indexado pela data de início com n_obs, slope, intercept,
+    annualized_growth_rate e current_log_residual (resíduo do último ponto na janela).
+    """
+    prepared = _prepare_log_close(data)
+    if prepared is None:
+        return None
+    close, log_close = prepared
+    n_total = len(log_close)
+    index = pd.to_datetime(close.index)
+
+    # Centralizar y não altera a inclinação nem os resíduos e reduz o cancelamento numérico
+    y_mean = log_close.mean()
+    y = log_close - y_mean
+    suffix_y = np.cumsum(y[::-1])[::-1]
+    suffix_ty = np.cumsum((np.arange(n_total, dtype=np.float64) * y)[::-1])[::-1]
+
+    if start_dates is None:
+        starts = np.arange(n_total)
+    else:
+        # Primeiro pregão na data pedida ou depois dela
+        starts = np.unique(index.searchsorted(pd.to_datetime(pd.Index(start_dates))))
+        starts = starts[starts < n_total]
+    n_obs = n_total - starts
+    starts = starts[n_obs >= max(min_points, 2)]
+    n_obs = n_total - starts
+
+    sum_y = suffix_y[starts]
+    # Σ (t - s) y = Σ t y - s Σ y: rebase do tempo para começar em 0 em cada janela
+    slope, intercept = _trend_from_sums(n_obs, sum_y, suffix_ty[starts] - starts * sum_y)
+    current_log_residual = y[-1] - (intercept + slope * (n_obs - 1))
+
+    sweep = pd.DataFrame({
+        'n_obs': n_obs,
+        'slope': slope,
+        'intercept': intercept + y_mean,
+        'annualized_growth_rate': _annualized_growth_rate(slope),
+        'current_log_residual': current_log_residual,
+    }, index=index[starts])
+    sweep.index.name = 'start_date'
+    return sweep
+
+
+# Elementos (janelas × pregões) processados por bloco no máximo/mínimo móvel dos resíduos
+_ROLLING_BLOCK_ELEMENTS = 2_000_000
+
+# Horizontes padrão dos retornos futuros do backtest, em dias de negociação
+DEFAULT_BACKTEST_HORIZONS = (21, 63, 126, 252)
+
+
+def rolling_log_channel(data, window=5 * TRADING_DAYS_PER_YEAR, band_quantiles=None):
+    """
+    Canal de regressão logarítmica walk-forward: para cada pregão t (a partir do pregão
+    window - 1), ajusta o canal de calculate_log_regression sobre os window pregões que
+    terminam em t, sem olhar o futuro.
+    As regressões saem de somas prefixadas de y e t*y (O(1) por janela). O resíduo máximo
+    e o mínimo dependem da inclinação de cada janela, então não podem ser mantidos por
+    um deque monotônico sobre um resíduo fixo: são calculados de forma exata, em blocos
+    vetorizados sobre vistas deslizantes do log do fechamento.
+    Retorna um DataFrame indexado pela data t com Close, predicted_close, os quatro canais,
+    slope, annualized_growth_rate, max/min_log_residual, log_residual (resíduo de t) e
+    channel_position (0 no canal exterior inferior, 1 no superior), ou None em caso de erro.
+    band_quantiles acrescenta as bandas de quantis de cada janela (colunas band_p1, ...): saem do
+    mesmo bloco de resíduos, por np.partition, que então fornece também o máximo e o mínimo.
+    """
+    if band_quantiles is not None:
+        band_quantiles = _check_quantiles(band_quantiles)
+    prepared = _prepare_log_close(data)
+    if prepared is None:
+        return None
+    close, log_close = prepared
+    n_total = len(log_close)
+    if window < 2 or window > n_total:
+        print(f"Erro: Janela de {window} pregões inválida para {n_total} pontos disponíveis.")
+        return None
+
+    # Centralizar y não altera inclinações nem resíduos e reduz o cancelamento nas somas
+    y_mean = log_close.mean()
+    y = log_close - y_mean
+    prefix_y = np.concatenate(([0.0], np.cumsum(y)))
+    prefix_ty = np.concatenate(([0.0], np.cumsum(np.arange(n_total, dtype=np.float64) * y)))
+
+    starts = np.arange(n_total - window + 1)
+    ends = starts + window
+    sum_y = prefix_y[ends] - prefix_y[starts]
+    # Σ (t - s) y = Σ t y - s Σ y: o tempo de cada janela começa em 0, como no ajuste individual
+    slope, intercept = _trend_from_sums(window, sum_y, prefix_ty[ends] - prefix_ty[starts] - starts * sum_y)
+
+    # max/min de y_i - inclinação * (i - s) em cada janela, em blocos de janelas para limitar a memória
+    windows = np.lib.stride_tricks.sliding_window_view(y, window)
+    time = np.arange(window, dtype=np.float64)
+    max_detrended = np.empty(len(starts))
+    min_detrended = np.empty(len(starts))
+    if band_quantiles is not None:
+        # Quantis 0 e 1 da seleção são exatamente o mínimo e o máximo
+        selected_quantiles = np.concatenate(([0.0, 1.0], band_quantiles))
+        quantile_detrended = np.empty((len(starts), len(band_quantiles)))
+    block = max(1, _ROLLING_BLOCK_ELEMENTS // window)
+    for first in range(0, len(starts), block):
+        rows = slice(first, first + block)
+        detrended = windows[rows] - slope[rows, None] * time
+        if band_quantiles is None:
+            max_detrended[rows] = detrended.max(axis=1)
+            min_detrended[rows] = detrended.min(axis=1)
+        else:
+            selected = _partition_quantiles(detrended, selected_quantiles, axis=1)
+            min_detrended[rows], max_detrended[rows] = selected[:, 0], selected[:, 1]
+            quantile_detrended[rows] = selected[:, 2:]
+
+    max_log_residual = max_detrended - intercept
+    min_log_residual = min_detrended - intercept
+    log_predicted_close = intercept + slope * (window - 1)
+    log_residual = y[window - 1:] - log_predicted_close
+    log_predicted_close += y_mean
+
+    predicted_close = np.exp(log_predicted_close)
+    frame = {
+        'Close': close.to_numpy(dtype=np.float64)[window - 1:],
+        'predicted_close': predicted_close,
+    }
+    for column, (max_weight, min_weight) in _CHANNEL_COLUMNS.items():
+        frame[column] = predicted_close * np.exp(max_weight * max_log_residual + min_weight * min_log_residual)
+    if band_quantiles is not None:
+        for position, quantile in enumerate(band_quantiles.tolist()):
+            frame[_band_column(quantile)] = predicted_close * np.exp(quantile_detrended[:, position] - intercept)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame.update({
+            'slope': slope,
+            'annualized_growth_rate': _annualized_growth_rate(slope),
+            'max_log_residual': max_log_residual,
+            'min_log_residual': min_log_residual,
+            'log_residual': log_residual,
+            'channel_position': _channel_position(log_residual, min_log_residual, max_log_residual),
+        })
+    rolling = pd.DataFrame(frame, index=pd.to_datetime(close.index[window - 1:]))
+    rolling.index.name = 'Date'
+    return rolling
 
 
-def project_log_channel(model, max_log_residual, min_log_residual, df_clean_length):
-    # ... (função project_log_channel permanece a mesma) ...
+def backtest_channel_signals(data, window=5 * TRADING_DAYS_PER_YEAR, horizons=DEFAULT_BACKTEST_HORIZONS, touch_tolerance=0.0):
+    """
+    Backtest dos toques no canal: classifica cada pregão do rolling_log_channel pela zona
+    em que o fechamento estava e mede o retorno futuro em cada horizonte (dias de negociação).
+    Zonas: 'upper_outer' (no canal exterior superior, com folga de touch_tolerance em log),
+    'upper_inner' (acima do canal interior superior), 'middle', 'lower_inner' e 'lower_outer'.
+    signal marca o primeiro pregão de cada permanência numa zona que não seja 'middle'.
+    Retorna o DataFrame do rolling_log_channel com as colunas zone, signal e
+    forward_return_<h>d (fração; NaN quando o horizonte passa do fim da série), ou None.
+    """
+    rolling = rolling_log_channel(data, window)
+    if rolling is None:
+        return None
+
+    residual = rolling['log_residual'].to_numpy()
+    max_log_residual = rolling['max_log_residual'].to_numpy()
+    min_log_residual = rolling['min_log_residual'].to_numpy()
+    zone = np.select(
+        [
+            residual >= max_log_residual - touch_tolerance,
+            residual <= min_log_residual + touch_tolerance,
+            residual >= 0.5 * max_log_residual,
+            residual <= 0.5 * min_log_residual,
+        ],
+        ['upper_outer', 'lower_outer', 'upper_inner', 'lower_inner'],
+        default='middle',
+    )
+    rolling['zone'] = zone
+    rolling['signal'] = (zone != 'middle') & (zone != np.roll(zone, 1))
+    rolling.iloc[0, rolling.columns.get_loc('signal')] = zone[0] != 'middle'
+
+    close = rolling['Close'].to_numpy()
+    for horizon in horizons:
+        forward = np.full(len(close), np.nan)
+        if horizon < len(close):
+            forward[:len(close) - horizon] = close[horizon:] / close[:len(close) - horizon] - 1
+        rolling[f"forward_return_{horizon}d"] = forward
+    return rolling
+
+
+def summarize_channel_signals(signals, signals_only=True):
+    """
+    Estatísticas dos retornos futuros por zona do canal a partir de backtest_channel_signals:
+    número de eventos e, por horizonte, média, mediana e fração de retornos positivos.
+    signals_only=True usa só os pregões de entrada na zona (evita contar a mesma
+    permanência várias vezes); False usa todos os pregões.
+    """
+    if signals is None or signals.empty:
+        return None
+    events = signals[signals['signal']] if signals_only else signals
+    return_columns = [column for column in signals.columns if column.startswith('forward_return_')]
+    grouped = events.groupby('zone')[return_columns]
+    summary = grouped.agg(['mean', 'median', lambda returns: (returns.dropna() > 0).mean()])
+    summary = summary.rename(columns={'<lambda_0>': 'hit_rate'}, level=1)
+    summary.insert(0, ('n_events', ''), events.groupby('zone').size())
+    zones = ['upper_outer', 'upper_inner', 'middle', 'lower_inner', 'lower_outer']
+    return summary.reindex([zone for zone in zones if zone in summary.index])
+
+
+class OnlineLogChannel:
+    """
+    Canal de regressão logarítmica atualizado incrementalmente, barra a barra.
+    Guarda apenas as estatísticas suficientes do OLS (n, Σy, Σty; Σt e Σt² têm forma
+    fechada porque t = 0, 1, ..., n-1) e os fechos convexos superior e inferior dos pontos
+    (t, log_close). O resíduo máximo para qualquer inclinação b é max(y - b t) - intercepto,
+    atingido num vértice do fecho superior (o mínimo, no inferior): ao mudar a inclinação
+    basta uma busca binária no fecho, sem reprocessar o histórico.
+    append custa O(1) amortizado. O estado é serializável com to_dict/from_dict (ou save/load em JSON).
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.sum_y = 0.0
+        self.sum_ty = 0.0
+        self.last_close = None
+        self.last_date = None
+        # Vértices (t, log_close) dos fechos convexos, em ordem crescente de t
+        self._upper_t, self._upper_y = [], []
+        self._lower_t, self._lower_y = [], []
+
+    @classmethod
+    def from_data(cls, data):
+        """Cria o canal a partir de um DataFrame com a coluna 'Close' (mesma limpeza de calculate_log_regression)."""
+        prepared = _prepare_log_close(data)
+        if prepared is None:
+            return None
+        close, log_close = prepared
+        channel = cls()
+        channel._extend_log(log_close)
+        channel.last_close = float(close.iloc[-1])
+        channel.last_date = pd.Timestamp(close.index[-1])
+        return channel
+
+    def append(self, close, date=None):
+        """Acrescenta uma nova barra de fechamento. Preços cujo log não é finito são ignorados."""
+        log_close = np.log(close + 1e-9)
+        if not np.isfinite(log_close):
+            print(f"Aviso: fechamento inválido ignorado na atualização do canal: {close}")
+            return
+        self._extend_log(np.array([log_close], dtype=np.float64))
+        self.last_close = float(close)
+        if date is not None:
+            self.last_date = pd.Timestamp(date)
+
+    def update(self, data):
+        """
+        Acrescenta as barras de data (DataFrame com 'Close') posteriores a last_date.
+        Útil para atualizar o canal a cada fechamento com o resultado de get_stock_data.
+        Retorna o número de barras acrescentadas.
+        """
+        if data is None or data.empty:
+            return 0
+        close = data['Close'].sort_index()
+        if self.last_date is not None:
+            close = close[pd.to_datetime(close.index) > self.last_date]
+        log_close = np.log(close.to_numpy(dtype=np.float64) + 1e-9)
+        valid = np.isfinite(log_close)
+        close = close[valid]
+        if close.empty:
+            return 0
+        self._extend_log(log_close[valid])
+        self.last_close = float(close.iloc[-1])
+        self.last_date = pd.Timestamp(close.index[-1])
+        return len(close)
+
+    def _extend_log(self, log_close):
+        time = np.arange(self.n, self.n + len(log_close), dtype=np.float64)
+        self.sum_y += float(log_close.sum())
+        self.sum_ty += float(time @ log_close)
+        self.n += len(log_close)
+        for t, y in zip(time.tolist(), log_close.tolist()):
+            _push_hull_vertex(self._upper_t, self._upper_y, t, y, upper=True)
+            _push_hull_vertex(self._lower_t, self._lower_y, t, y, upper=False)
+
+    @property
+    def slope(self):
+        return _trend_from_sums(self.n, self.sum_y, self.sum_ty)[0] if self.n >= 2 else None
+
+    @property
+    def intercept(self):
+        return _trend_from_sums(self.n, self.sum_y, self.sum_ty)[1] if self.n >= 2 else None
+
+    @property
+    def model(self):
+        """Modelo compatível com project_log_channel."""
+        return LinearTrendModel(self.intercept, self.slope) if self.n >= 2 else None
+
+    @property
+    def annualized_growth_rate(self):
+        return _annualized_growth_rate(self.slope) if self.n >= 2 else None
+
+    @property
+    def current_log_residual(self):
+        if self.n < 2:
+            return None
+        slope, intercept = _trend_from_sums(self.n, self.sum_y, self.sum_ty)
+        return self._upper_y[-1] - (intercept + slope * (self.n - 1))
+
+    @property
+    def max_log_residual(self):
+        if self.n < 2:
+            return None
+        slope, intercept = _trend_from_sums(self.n, self.sum_y, self.sum_ty)
+        return _hull_extreme(self._upper_t, self._upper_y, slope, upper=True) - intercept
+
+    @property
+    def min_log_residual(self):
+        if self.n < 2:
+            return None
+        slope, intercept = _trend_from_sums(self.n, self.sum_y, self.sum_ty)
+        return _hull_extreme(self._lower_t, self._lower_y, slope, upper=False) - intercept
+
+    def to_dict(self):
+        """Estado completo em tipos nativos (serializável com json.dumps)."""
+        return {
+            'n': self.n,
+            'sum_y': self.sum_y,
+            'sum_ty': self.sum_ty,
+            'last_close': self.last_close,
+            'last_date': self.last_date.isoformat() if self.last_date is not None else None,
+            'upper_hull': [self._upper_t, self._upper_y],
+            'lower_hull': [self._lower_t, self._lower_y],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        channel = cls()
+        channel.n = int(state['n'])
+        channel.sum_y = float(state['sum_y'])
+        channel.sum_ty = float(state['sum_ty'])
+        channel.last_close = state['last_close']
+        channel.last_date = pd.Timestamp(state['last_date']) if state['last_date'] is not None else None
+        channel._upper_t, channel._upper_y = [list(values) for values in state['upper_hull']]
+        channel._lower_t, channel._lower_y = [list(values) for values in state['lower_hull']]
+        return channel
+
+    def save(self, path):
+        """Grava o estado em JSON de forma atômica."""
+        tmp_path = price_cache.temporary_path(path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def _push_hull_vertex(hull_t, hull_y, t, y, upper):
+    """Acrescenta (t, y), com t maior que todos os anteriores, ao fecho convexo (cadeia monótona)."""
+    while len(hull_t) >= 2:
+        cross = (hull_t[-1] - hull_t[-2]) * (y - hull_y[-2]) - (hull_y[-1] - hull_y[-2]) * (t - hull_t[-2])
+        # Fecho superior só mantém curvas à direita (cross < 0); o inferior, à esquerda (cross > 0)
+        if (cross >= 0) if upper else (cross <= 0):
+            hull_t.pop()
+            hull_y.pop()
+        else:
+            break
+    hull_t.append(t)
+    hull_y.append(y)
+
+
+def _hull_extreme(hull_t, hull_y, slope, upper):
+    """
+    max(y - slope * t) no fecho superior (min no inferior) por busca binária:
+    as inclinações das arestas são monótonas ao longo do fecho.
+    """
+    lo, hi = 0, len(hull_t) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        edge_slope = (hull_y[mid + 1] - hull_y[mid]) / (hull_t[mid + 1] - hull_t[mid])
+        if (edge_slope > slope) if upper else (edge_slope < slope):
+            lo = mid + 1
+        else:
+            hi = mid
+    return hull_y[lo] - slope * hull_t[lo]
+
+
+# Horizontes padrão da tabela de projeção, em dias de negociação (~21 por mês)
+DEFAULT_PROJECTION_HORIZONS = {
+    'Atual': 0, # Corresponde ao último ponto histórico
+    'Em 3 meses': 63,
+    'Em 6 meses': 126,
+    'Em 9 meses': 189,
+    'Em 12 meses': 252,
+}
+
+# Linhas do canal e o deslocamento de cada uma em log, como fração de (resíduo máximo, resíduo mínimo)
+CHANNEL_LINES = {
+    'Canal Exterior Superior': (1.0, 0.0),
+    'Canal Interior Superior': (0.5, 0.0),
+    'Linha Central': (0.0, 0.0),
+    'Canal Interior Inferior': (0.0, 0.5),
+    'Canal Exterior Inferior': (0.0, 1.0),
+}
+
+
+def _project_channel_lines(model, max_log_residual, min_log_residual, df_clean_length, horizons):
+    """
+    Preços das cinco linhas do canal para cada horizonte (dias após o último ponto histórico)
+    numa única operação vetorizada. Retorna um array (linhas × horizontes).
+    Usa apenas model.params, então aceita o LinearTrendModel ou o resultado do statsmodels.
+    """
+    current_time_index = df_clean_length - 1
+    time = current_time_index + np.asarray(horizons, dtype=np.float64)
+    log_center = model.params['Intercept'] + model.params['time'] * time
+    weights = np.array(list(CHANNEL_LINES.values()))
+    offsets = weights @ np.array([max_log_residual, min_log_residual], dtype=np.float64)
+    return np.exp(offsets[:, None] + log_center[None, :])
+
+
+def project_log_channel(model, max_log_residual, min_log_residual, df_clean_length, horizons=None):
     """
     Projeta as linhas do canal de regressão logarítmica para o futuro.
-    Retorna os valores projetados em preço absoluto.
+    Retorna os valores projetados em preço absoluto (linhas do canal × períodos).
+    horizons pode ser um dict {rótulo: dias de negociação} ou uma sequência de dias
+    (colunas rotuladas pelo número de dias); por padrão usa DEFAULT_PROJECTION_HORIZONS.
     """
     if model is None or max_log_residual is None or min_log_residual is None or df_clean_length is None:
         return None
 
-    days_in_3_months = 63
-    days_in_6_months = 126
-    days_in_9_months = 189
-    days_in_12_months = 252
+    if horizons is None:
+        horizons = DEFAULT_PROJECTION_HORIZONS
+    if isinstance(horizons, dict):
+        labels, days = list(horizons.keys()), list(horizons.values())
+    else:
+        labels = days = list(horizons)
 
-    current_time_index = df_clean_length - 1
-    projection_time_indices = {
-        'Atual': current_time_index, # Corresponde ao último ponto histórico
-        'Em 3 meses': current_time_index + days_in_3_months,
-        'Em 6 meses': current_time_index + days_in_6_months,
-        'Em 9 meses': current_time_index + days_in_9_months,
-        'Em 12 meses': current_time_index + days_in_12_months,
+    with instrumentation.span('projection'):
+        projected_prices = _project_channel_lines(model, max_log_residual, min_log_residual, df_clean_length, days)
+    return pd.DataFrame(projected_prices, index=list(CHANNEL_LINES.keys()), columns=labels)
+
+
+def project_log_channel_path(model, max_log_residual, min_log_residual, df_clean_length, max_horizon=TRADING_DAYS_PER_YEAR):
+    """
+    Projeção densa do canal: um ponto por dia de negociação, de 0 (último ponto histórico)
+    até max_horizon. Retorna um DataFrame indexado pelo horizonte em dias com uma coluna
+    por linha do canal, pronto para ser desenhado como um cone à frente do gráfico.
+    """
+    if model is None or max_log_residual is None or min_log_residual is None or df_clean_length is None:
+        return None
+
+    horizons = np.arange(max_horizon + 1)
+    with instrumentation.span('projection_path'):
+        projected_prices = _project_channel_lines(model, max_log_residual, min_log_residual, df_clean_length, horizons)
+    path = pd.DataFrame(projected_prices.T, index=horizons, columns=list(CHANNEL_LINES.keys()))
+    path.index.name = 'horizon'
+    return path
+
+
+def run_analysis(ticker, start_date, end_date, fetch_timeout=None):
+    """
+    Executa a análise completa de um ticker: histórico, regressão e projeção.
+    As informações da empresa ficam de fora (veja fetch_stock_info_async), para que
+    uma chamada lenta de .info não atrase nem invalide o resultado.
+    fetch_timeout limita a espera pelo histórico (padrão FETCH_TIMEOUT).
+    Retorna um dict com 'regression' (LogChannelResult) e 'projection_table_prices';
+    'error' é None em caso de sucesso ou um dos códigos
+    'no_data', 'insufficient_data', 'regression_failed', 'projection_failed'.
+    Com 'insufficient_data', 'stock_data' traz o pouco histórico encontrado.
+    """
+    analysis = {
+        'ticker': ticker,
+        'start_date': start_date,
+        'end_date': end_date,
+        'error': None,
     }
 
-    line_names = [
-        'Canal Exterior Superior',
-        'Canal Interior Superior',
-        'Linha Central',
-        'Canal Interior Inferior',
-        'Canal Exterior Inferior',
-    ]
+    stock_data = _call_with_timeout(
+        f"obter dados históricos para o ticker '{ticker}'",
+        FETCH_TIMEOUT if fetch_timeout is None else fetch_timeout,
+        get_stock_data, ticker, start_date, end_date
+    )
+    if stock_data is None:
+        analysis['error'] = 'no_data'
+        return analysis
+    if len(stock_data) < 2:
+        analysis['error'] = 'insufficient_data'
+        analysis['stock_data'] = stock_data
+        return analysis
 
-    projected_prices = {line: [] for line in line_names}
+    analysis['regression'] = calculate_log_regression(stock_data)
+    if analysis['regression'] is None:
+        analysis['error'] = 'regression_failed'
+        return analysis
 
-    for period, time_index_value in projection_time_indices.items():
-        exog_predict_df = pd.DataFrame({'time': [time_index_value]})
-        log_pred_center = model.predict(exog_predict_df)[0]
+    regression = analysis['regression']
+    analysis['projection_table_prices'] = project_log_channel(
+        regression.model,
+        regression.max_log_residual,
+        regression.min_log_residual,
+        len(regression)
+    )
+    if analysis['projection_table_prices'] is None:
+        analysis['error'] = 'projection_failed'
 
-        log_pred_upper_outer = log_pred_center + max_log_residual
-        log_pred_lower_outer = log_pred_center + min_log_residual
-        log_pred_upper_inner = log_pred_center + max_log_residual / 2
-        log_pred_lower_inner = log_pred_center + min_log_residual / 2 # CORRIGIDO NESTA FUNÇÃO
+    return analysis
 
 
-        pred_center = np.exp(log_pred_center)
-        pred_upper_outer = np.exp(log_pred_upper_outer)
-        pred_lower_outer = np.exp(log_pred_lower_outer)
-        pred_upper_inner = np.exp(log_pred_upper_inner)
-        pred_lower_inner = np.exp(log_pred_lower_inner) # CORRIGIDO: Usando log_pred_lower_inner
+# Nomes curtos das linhas do canal nas colunas do resumo (ex.: projection_12m_center)
+_CHANNEL_LINE_KEYS = {
+    'Canal Exterior Superior': 'upper_outer',
+    'Canal Interior Superior': 'upper_inner',
+    'Linha Central': 'center',
+    'Canal Interior Inferior': 'lower_inner',
+    'Canal Exterior Inferior': 'lower_outer',
+}
 
-        projected_prices['Canal Exterior Superior'].append(pred_upper_outer)
-        projected_prices['Canal Interior Superior'].append(pred_upper_inner)
-        projected_prices['Linha Central'].append(pred_center)
-        projected_prices['Canal Interior Inferior'].append(pred_lower_inner)
-        projected_prices['Canal Exterior Inferior'].append(pred_lower_outer)
 
-    projected_df_prices = pd.DataFrame(projected_prices, index=projection_time_indices.keys()).T
+def summarize_analysis(analysis):
+    """
+    Resume o resultado de run_analysis numa linha plana (dict de escalares) para telas,
+    arquivos e APIs: parâmetros do canal, posição atual, quantis dos resíduos
+    (DEFAULT_BAND_QUANTILES) e preços projetados nos horizontes padrão. 'status' é 'ok'
+    ou o código de erro; em caso de erro só as chaves de identificação são preenchidas.
+    """
+    row = {
+        'ticker': analysis['ticker'],
+        'start_date': str(analysis['start_date']),
+        'end_date': str(analysis['end_date']),
+        'status': analysis['error'] or 'ok',
+    }
+    regression = analysis.get('regression')
+    if regression is None:
+        return row
+
+    row.update({
+        'n_obs': len(regression),
+        'first_date': regression.index[0].date().isoformat(),
+        'last_date': regression.index[-1].date().isoformat(),
+        'current_actual_price': regression.current_actual_price,
+        'slope': regression.slope,
+        'annualized_growth_rate': float(regression.annualized_growth_rate),
+        'max_log_residual': regression.max_log_residual,
+        'min_log_residual': regression.min_log_residual,
+        'current_log_residual': regression.current_log_residual,
+        'channel_position': regression.channel_position,
+        'residual_percentile': regression.residual_percentile,
+    })
+    for quantile, log_residual in regression.residual_quantiles(DEFAULT_BAND_QUANTILES).items():
+        row[f"{_band_column(quantile)}_log_residual"] = log_residual
 
-    return projected_df_prices
\ No newline at end of file
+    projection = analysis.get('projection_table_prices')
+    if projection is not None:
+        for label, days in DEFAULT_PROJECTION_HORIZONS.items():
+            horizon = 'now' if days == 0 else f"{days // 21}m"
+            for line, key in _CHANNEL_LINE_KEYS.items():
+                row[f"projection_{horizon}_{key}"] = float(projection.loc[line, label])
+    return row
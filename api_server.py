@@ -0,0 +1,204 @@
+# api_server.py
+"""
+API HTTP assíncrona (Tornado) com os números do canal de regressão logarítmica em JSON.
+
+Rotas:
+    GET /v1/analysis/<ticker>?start=AAAA-MM-DD&end=AAAA-MM-DD
+    GET /v1/analysis?tickers=PETR4.SA,VALE3.SA&start=...&end=...
+    GET /healthz
+
+Cada ticker é respondido com a linha de analysis_module.summarize_analysis (taxa de
+crescimento, resíduo atual e percentil, quantis dos resíduos, posição no canal e preços
+das linhas do canal hoje e nos horizontes de projeção). Padrões das datas: os últimos 5 anos até hoje, como no app.
+
+Requisições simultâneas pelo mesmo ticker e período compartilham um único cálculo
+(single-flight), e os resultados ficam no result_cache do processo. As respostas levam
+ETag (derivado do conteúdo da resposta) e Cache-Control: períodos já encerrados podem
+ser guardados por um dia, períodos que terminam hoje por LOG_RET_API_MAX_AGE segundos.
+
+Exemplo:
+    python api_server.py --port 8000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import tornado.web
+
+import analysis_module
+import result_cache
+
+# Validade (s) das respostas de períodos que ainda podem ganhar pregões
+MAX_AGE = int(os.environ.get('LOG_RET_API_MAX_AGE', 300))
+# Validade (s) das respostas de períodos já encerrados
+CLOSED_PERIOD_MAX_AGE = 24 * 3600
+# Máximo de tickers numa requisição em lote
+MAX_BATCH = int(os.environ.get('LOG_RET_API_MAX_BATCH', 50))
+
+# run_analysis é bloqueante (rede e NumPy): roda neste pool, fora do loop de eventos
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('LOG_RET_API_WORKERS', 8)),
+    thread_name_prefix='log_ret_api'
+)
+# Cálculos em andamento, por chave: pedidos iguais aguardam o mesmo Future
+_inflight = {}
+
+
+def _json_safe(value):
+    """NaN e infinitos não existem em JSON: viram null."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _compute_summary(ticker, start_date, end_date):
+    """
+    Linha de resumo de um ticker. Uma exceção vira uma linha com status 'unexpected_error'
+    (como em batch_cli.analyze_chunk), para que um ticker problemático não derrube o lote.
+    """
+    try:
+        analysis = analysis_module.run_analysis(ticker, start_date, end_date)
+        summary = analysis_module.summarize_analysis(analysis)
+    except Exception as e:
+        print(f"Erro inesperado ao analisar '{ticker}': {e}")
+        summary = {'ticker': ticker, 'start_date': str(start_date), 'end_date': str(end_date),
+                   'status': 'unexpected_error', 'error_message': f"{type(e).__name__}: {e}"}
+    return {key: _json_safe(value) for key, value in summary.items()}
+
+
+async def get_summary(ticker, start_date, end_date):
+    """
+    Linha de resumo de um ticker: do result_cache se possível; senão calculada no pool,
+    uma única vez para todos os pedidos simultâneos da mesma chave. Erros não são guardados.
+    """
+    key = ('api_summary', ticker, start_date, end_date)
+    summary = result_cache.shared_cache.get(key)
+    if summary is not None:
+        return summary
+
+    future = _inflight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_EXECUTOR, result_cache.shared_cache.get_or_compute, key,
+                                      lambda: _compute_summary(ticker, start_date, end_date),
+                                      lambda summary: summary['status'] == 'ok')
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: um cliente que desconecta não cancela o cálculo dos demais
+    return await asyncio.shield(future)
+
+
+def _etag(summaries):
+    """
+    ETag fraco a partir do conteúdo serializado das linhas: o pregão do dia muda o
+    fechamento (e a inclinação, os resíduos e os preços) sem mudar a data nem o n_obs.
+    """
+    body = json.dumps(summaries, sort_keys=True)
+    return f'W/"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+
+class BaseHandler(tornado.web.RequestHandler):
+
+    def set_default_headers(self):
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+
+    def write_error(self, status_code, **kwargs):
+        reason = self._reason
+        if 'exc_info' in kwargs and isinstance(kwargs['exc_info'][1], tornado.web.HTTPError):
+            reason = kwargs['exc_info'][1].log_message or reason
+        self.finish(json.dumps({'error': reason}))
+
+    def parse_period(self):
+        """Datas de start/end (AAAA-MM-DD); padrão: últimos 5 anos até hoje."""
+        today = date.today()
+        try:
+            end_date = date.fromisoformat(self.get_query_argument('end', today.isoformat()))
+            start_date = date.fromisoformat(self.get_query_argument('start', (end_date - timedelta(days=5 * 365)).isoformat()))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Datas inválidas: use AAAA-MM-DD.")
+        if start_date >= end_date:
+            raise tornado.web.HTTPError(400, "A data de início deve ser anterior à data de fim.")
+        return start_date, end_date
+
+    def respond(self, payload, summaries, end_date, status=200):
+        """Resposta JSON com ETag e Cache-Control; 304 se o cliente já tem a versão atual."""
+        etag = _etag(summaries)
+        self.set_header('ETag', etag)
+        if all(summary['status'] == 'ok' for summary in summaries):
+            max_age = CLOSED_PERIOD_MAX_AGE if end_date <= date.today() - timedelta(days=1) else MAX_AGE
+            self.set_header('Cache-Control', f"public, max-age={max_age}")
+        else:
+            self.set_header('Cache-Control', 'no-store')
+        if status == 200 and etag in self.request.headers.get('If-None-Match', ''):
+            self.set_status(304)
+            return self.finish()
+        self.set_status(status)
+        self.finish(json.dumps(payload))
+
+
+class AnalysisHandler(BaseHandler):
+    """Um ticker: 200 com o resumo, 404 sem dados, 422 se a análise falhar, 500 em erro inesperado."""
+
+    async def get(self, ticker):
+        start_date, end_date = self.parse_period()
+        summary = await get_summary(ticker.upper(), start_date, end_date)
+        status = {'ok': 200, 'no_data': 404, 'unexpected_error': 500}.get(summary['status'], 422)
+        self.respond(summary, [summary], end_date, status)
+
+
+class BatchAnalysisHandler(BaseHandler):
+    """Vários tickers (parâmetro tickers separado por vírgulas), calculados em paralelo."""
+
+    async def get(self):
+        start_date, end_date = self.parse_period()
+        tickers = list(dict.fromkeys(
+            ticker.strip().upper() for ticker in self.get_query_argument('tickers', '').split(',') if ticker.strip()
+        ))
+        if not tickers:
+            raise tornado.web.HTTPError(400, "Informe ao menos um ticker em 'tickers'.")
+        if len(tickers) > MAX_BATCH:
+            raise tornado.web.HTTPError(400, f"No máximo {MAX_BATCH} tickers por requisição.")
+        summaries = await asyncio.gather(*(get_summary(ticker, start_date, end_date) for ticker in tickers))
+        # Um ticker com erro torna o lote inteiro não guardável (veja respond)
+        self.respond({'results': summaries}, summaries, end_date)
+
+
+class HealthHandler(BaseHandler):
+
+    def get(self):
+        self.finish(json.dumps({'status': 'ok', 'cache': result_cache.shared_cache.stats()}))
+
+
+def make_app():
+    return tornado.web.Application([
+        (r'/v1/analysis/([^/]+)', AnalysisHandler),
+        (r'/v1/analysis', BatchAnalysisHandler),
+        (r'/healthz', HealthHandler),
+    ])
+
+
+async def serve(port, address):
+    app = make_app()
+    app.listen(port, address)
+    print(f"API do canal de regressão logarítmica em http://{address}:{port}")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API JSON do canal de regressão logarítmica.")
+    parser.add_argument('--port', type=int, default=8000, help="Porta HTTP.")
+    parser.add_argument('--address', default='127.0.0.1', help="Endereço de escuta.")
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.port, args.address))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
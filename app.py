@@ -3,9 +3,12 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
+import time
 from datetime import date, timedelta
 import analysis_module # Importa o módulo de análise
+import result_cache
+import downsampling
+import instrumentation
 
 # --- Funções Auxiliares de Formatação ---
 def format_market_cap(market_cap):
@@ -42,19 +45,40 @@ st.set_page_config(
 )
 
 # --- Inicialização de st.session_state ---
-# Inicializa as variáveis que armazenarão os resultados da análise
-if 'analysis_performed' not in st.session_state:
-    st.session_state.analysis_performed = False
-    st.session_state.stock_info = None
-    st.session_state.regression_data = None
-    st.session_state.model = None
-    st.session_state.max_log_residual = None
-    st.session_state.min_log_residual = None
-    st.session_state.log_residuals = None
-    st.session_state.current_residual = None
-    st.session_state.current_actual_price = None
-    st.session_state.projection_table_prices = None
-    st.session_state.annualized_growth_rate = None # Adicionado
+# A sessão guarda apenas a chave da última análise; os resultados ficam no cache
+# compartilhado do processo (result_cache.shared_cache), servindo todas as sessões.
+if 'analysis_key' not in st.session_state:
+    st.session_state.analysis_key = None
+    # Informações da empresa (Future) buscadas em paralelo ao histórico
+    st.session_state.info_future = None
+    st.session_state.info_requested_at = None
+
+# Largura de referência do gráfico de preço em pixels: a amostragem envia até 2 pontos por pixel
+CHART_WIDTH_PX = 1400
+
+# Tempo máximo (s) que o cabeçalho espera pelas informações da empresa antes de desistir
+INFO_WAIT_SECONDS = 20
+
+# Número de bins do histograma de resíduos
+RESIDUAL_HISTOGRAM_BINS = 50
+
+
+def _run_analysis_traced(ticker, start_date, end_date):
+    with instrumentation.span('run_analysis'):
+        return analysis_module.run_analysis(ticker, start_date, end_date)
+
+
+def get_analysis(analysis_key):
+    """
+    Busca a análise no cache compartilhado, calculando-a se necessário
+    (primeira requisição ou resultado expirado/expulso). Erros não são guardados.
+    """
+    ticker, start_date, end_date = analysis_key
+    return result_cache.shared_cache.get_or_compute(
+        ('analysis',) + analysis_key,
+        lambda: _run_analysis_traced(ticker, start_date, end_date),
+        should_cache=lambda analysis: analysis['error'] is None
+    )
 
 
 # --- Título da Aplicação ---
@@ -77,105 +101,139 @@ end_date = st.sidebar.date_input("Data de Fim", today)
 if start_date >= end_date:
     st.sidebar.error("Erro: A data de início deve ser anterior à data de fim.")
 
+# Horizonte do cone de projeção desenhado no gráfico (0 desativa)
+projection_months = st.sidebar.slider("Projeção no Gráfico (meses)", min_value=0, max_value=60, value=12, step=3)
+
+# Bandas de quantis dos resíduos (1%, 5%, 95% e 99%) sobrepostas aos canais de máximo/mínimo
+show_quantile_bands = st.sidebar.checkbox("Bandas de Quantis dos Resíduos", value=False)
+
+# Sem amostragem, todos os pontos do período são enviados ao navegador
+full_resolution_chart = st.sidebar.checkbox("Resolução Total no Gráfico", value=False)
+
 analyze_button = st.sidebar.button("Analisar Ação")
 
+# Painel de depuração: tempos por etapa da última execução (liga a instrumentação nesta sessão)
+debug_panel = st.sidebar.checkbox("Depuração: Tempos por Etapa", value=False)
+run_trace = instrumentation.start_trace(
+    'app_run',
+    enabled=True if debug_panel else None,
+    ticker=ticker,
+    start_date=str(start_date),
+    end_date=str(end_date),
+    trigger='button' if analyze_button else 'rerun'
+)
+
 # --- Lógica Principal (Quando o botão é clicado) ---
-# Este bloco SÓ RODA quando o botão é clicado. Faz a análise e SALVA no session_state.
+# Este bloco SÓ RODA quando o botão é clicado. Faz a análise (ou a reaproveita do cache) e SALVA a chave no session_state.
 if analyze_button:
-    # Limpar resultados anteriores no session_state
-    st.session_state.analysis_performed = False
-    st.session_state.stock_info = None
-    st.session_state.regression_data = None
-    st.session_state.model = None
-    st.session_state.max_log_residual = None
-    st.session_state.min_log_residual = None
-    st.session_state.log_residuals = None
-    st.session_state.current_residual = None
-    st.session_state.current_actual_price = None
-    st.session_state.projection_table_prices = None
-    st.session_state.annualized_growth_rate = None # Limpa também a taxa de crescimento
+    # Limpar a análise anterior da sessão
+    st.session_state.analysis_key = None
 
     if start_date >= end_date:
         st.error("Corrija as datas antes de analisar.")
     elif not ticker:
          st.error("Por favor, insira um ticker de ação.")
     else:
-        with st.spinner(f"Buscando dados e informações para {ticker}..."):
-            # Obter informações adicionais do ticker
-            st.session_state.stock_info = analysis_module.get_stock_info(ticker)
+        # As informações da empresa (.info) são buscadas em segundo plano, em paralelo
+        # ao histórico; se demorarem, o gráfico é exibido antes e elas aparecem depois
+        st.session_state.info_future = analysis_module.fetch_stock_info_async(ticker)
+        st.session_state.info_requested_at = time.monotonic()
 
-            # Obter dados históricos da ação
-            stock_data = analysis_module.get_stock_data(ticker, start_date, end_date)
+        with st.spinner(f"Buscando dados e informações para {ticker}..."):
+            analysis_key = (ticker, start_date, end_date)
+            analysis = get_analysis(analysis_key)
 
-            if stock_data is None:
+            if analysis['error'] == 'no_data':
                 st.error(f"Não foi possível obter dados históricos para o ticker '{ticker}'. Verifique o ticker e o período.")
-            elif len(stock_data) < 2:
+            elif analysis['error'] == 'insufficient_data':
+                 stock_data = analysis['stock_data']
                  st.warning(f"Aviso: Foram encontrados apenas {len(stock_data)} dias de dados válidos. Mínimo necessário é 2 para regressão. Não é possível calcular o canal.")
                  if not stock_data.empty:
                       st.line_chart(stock_data['Close']) # Mostra o gráfico de preço se houver algum dado
+            elif analysis['error'] == 'regression_failed':
+                 st.error("Erro ao calcular o canal de regressão. Certifique-se de que há dados suficientes e válidos para o período.")
+            elif analysis['error'] == 'projection_failed':
+                st.warning("Análise de projeção ou preço atual falhou após cálculo da regressão.")
             else:
-                # Calcular Regressão Logarítmica e Canal (Recebe múltiplos retornos)
-                # Recebe a taxa de crescimento também
-                (
-                    st.session_state.regression_data,
-                    st.session_state.model,
-                    st.session_state.max_log_residual,
-                    st.session_state.min_log_residual,
-                    st.session_state.log_residuals,
-                    st.session_state.current_residual,
-                    st.session_state.current_actual_price,
-                    st.session_state.annualized_growth_rate # Recebe a taxa de crescimento
-                ) = analysis_module.calculate_log_regression(stock_data)
-
-                if st.session_state.regression_data is None: # Verifica se o primeiro retorno (df_plot) é None
-                     st.error("Erro ao calcular o canal de regressão. Certifique-se de que há dados suficientes e válidos para o período.")
-                else:
-                    # Calcular a tabela de projeção (preços absolutos) APENAS UMA VEZ aqui
-                    st.session_state.projection_table_prices = analysis_module.project_log_channel(
-                        st.session_state.model,
-                        st.session_state.max_log_residual,
-                        st.session_state.min_log_residual,
-                        len(st.session_state.regression_data) # Passamos o comprimento dos dados limpos
-                    )
-
-                    # Se chegamos aqui com sucesso e temos dados para projeção e preço atual
-                    if st.session_state.projection_table_prices is not None and st.session_state.current_actual_price is not None:
-                         st.session_state.analysis_performed = True
-                    else:
-                        st.warning("Análise de projeção ou preço atual falhou após cálculo da regressão.")
-                        st.session_state.analysis_performed = False # Marca como não realizada se projeção falhou
-
-
-# --- Lógica de Exibição (Este bloco roda a CADA rerun se analysis_performed for True) ---
-# Tudo aqui acessa os dados do session_state, persistindo entre reruns de widgets.
-if st.session_state.analysis_performed:
-    # Exibir informações adicionais da empresa (se disponíveis)
-    if st.session_state.stock_info:
-        company_name = st.session_state.stock_info.get('longName', ticker)
-        market_cap = st.session_state.stock_info.get('marketCap')
-        st.subheader(f"{company_name} ({ticker})")
-        if market_cap is not None:
-            st.markdown(f"**Capitalização de Mercado:** {format_market_cap(market_cap)}")
-        # Exibir a taxa de crescimento anualizada aqui
-        st.markdown(f"**Taxa de Crescimento Anualizada (Regressão Log):** {format_growth_rate(st.session_state.annualized_growth_rate)}")
+                st.session_state.analysis_key = analysis_key
 
-    else:
-         st.subheader(f"Análise para {ticker}")
-         # Exibir a taxa de crescimento mesmo se info da empresa falhar, se estiver calculada
-         if st.session_state.annualized_growth_rate is not None:
-             st.markdown(f"**Taxa de Crescimento Anualizada (Regressão Log):** {format_growth_rate(st.session_state.annualized_growth_rate)}")
+
+# --- Lógica de Exibição (Este bloco roda a CADA rerun se houver uma análise na sessão) ---
+# Tudo aqui acessa a análise do cache compartilhado, persistindo entre reruns de widgets.
+analysis = get_analysis(st.session_state.analysis_key) if st.session_state.analysis_key is not None else None
+if analysis is not None and analysis['error'] is None:
+    regression = analysis['regression']
+
+    info_future = st.session_state.info_future
+    info_pending = (
+        info_future is not None and not info_future.done()
+        and time.monotonic() - st.session_state.info_requested_at < INFO_WAIT_SECONDS
+    )
+
+    # Enquanto as informações não chegam, o cabeçalho é reexecutado sozinho a cada segundo
+    @st.fragment(run_every=1 if info_pending else None)
+    def show_company_header():
+        if info_pending and (info_future.done() or time.monotonic() - st.session_state.info_requested_at >= INFO_WAIT_SECONDS):
+            st.rerun() # Chegaram (ou desistimos): redesenha a página sem a atualização periódica
+
+        stock_info = info_future.result() if info_future is not None and info_future.done() else None
+
+        # Exibir informações adicionais da empresa (se disponíveis)
+        if stock_info:
+            company_name = stock_info.get('longName', ticker)
+            market_cap = stock_info.get('marketCap')
+            st.subheader(f"{company_name} ({ticker})")
+            if market_cap is not None:
+                st.markdown(f"**Capitalização de Mercado:** {format_market_cap(market_cap)}")
+            # Exibir a taxa de crescimento anualizada aqui
+            st.markdown(f"**Taxa de Crescimento Anualizada (Regressão Log):** {format_growth_rate(regression.annualized_growth_rate)}")
+
+        else:
+             st.subheader(f"Análise para {ticker}")
+             # Exibir a taxa de crescimento mesmo se info da empresa falhar, se estiver calculada
+             if regression.annualized_growth_rate is not None:
+                 st.markdown(f"**Taxa de Crescimento Anualizada (Regressão Log):** {format_growth_rate(regression.annualized_growth_rate)}")
+             if info_pending:
+                 st.caption("Carregando informações da empresa...")
+
+    show_company_header()
 
 
     # 3. Visualização Gráfica do Preço e Canais (Plotly)
     st.subheader(f"Gráfico de Preço e Canal de Regressão Logarítmica")
 
+    # Janela exibida: reduzir a janela reamostra só o trecho escolhido, em resolução total
+    # quando ele couber no limite de pontos (equivale a dar zoom com dados completos)
+    window_start, window_end = regression.index[0].date(), regression.index[-1].date()
+    if window_start < window_end:
+        window_start, window_end = st.slider(
+            "Janela do Gráfico",
+            min_value=window_start,
+            max_value=window_end,
+            value=(window_start, window_end),
+            format="DD/MM/YYYY"
+        )
+    # As colunas de preço e canais são derivadas só para as linhas da janela
+    window_rows = slice(
+        regression.index.searchsorted(pd.Timestamp(window_start)),
+        regression.index.searchsorted(pd.Timestamp(window_end) + pd.Timedelta(days=1))
+    )
+    chart_data = regression.to_frame(window_rows, band_quantiles=analysis_module.DEFAULT_BAND_QUANTILES if show_quantile_bands else None)
+
+    # Amostragem (LTTB) para não serializar centenas de milhares de pontos a cada rerun
+    with instrumentation.span('downsampling'):
+        if full_resolution_chart:
+            close_plot, channels_plot = chart_data[['Close']], chart_data
+        else:
+            close_plot, channels_plot = downsampling.downsample_channel_plot(chart_data, CHART_WIDTH_PX * 2)
+
     fig = go.Figure()
 
     # --- Adicionar traces com as NOVAS CORES E ESTILOS ---
     # Preço de Fechamento (Preto Cheio)
     fig.add_trace(go.Scattergl(
-        x=st.session_state.regression_data.index,
-        y=st.session_state.regression_data['Close'],
+        x=close_plot.index,
+        y=close_plot['Close'],
         mode='lines',
         name='Preço de Fechamento',
         line=dict(color='black', width=1, dash='solid')
@@ -183,8 +241,8 @@ if st.session_state.analysis_performed:
 
     # Linha Central da Regressão (Preto Pontilhado)
     fig.add_trace(go.Scattergl(
-        x=st.session_state.regression_data.index,
-        y=st.session_state.regression_data['predicted_close'],
+        x=channels_plot.index,
+        y=channels_plot['predicted_close'],
         mode='lines',
         name='Linha Central do Canal',
         line=dict(color='black', dash='dot', width=2)
@@ -192,8 +250,8 @@ if st.session_state.analysis_performed:
 
     # Canal Exterior Superior (Azul Pontilhado)
     fig.add_trace(go.Scattergl(
-        x=st.session_state.regression_data.index,
-        y=st.session_state.regression_data['upper_outer_channel'],
+        x=channels_plot.index,
+        y=channels_plot['upper_outer_channel'],
         mode='lines',
         name='Canal Exterior Superior',
         line=dict(color='blue', width=1, dash='dot'),
@@ -202,8 +260,8 @@ if st.session_state.analysis_performed:
 
     # Canal Interior Superior (Azul Cheio)
     fig.add_trace(go.Scattergl(
-        x=st.session_state.regression_data.index,
-        y=st.session_state.regression_data['upper_inner_channel'],
+        x=channels_plot.index,
+        y=channels_plot['upper_inner_channel'],
         mode='lines',
         name='Canal Interior Superior',
         line=dict(color='blue', width=1, dash='solid'),
@@ -212,8 +270,8 @@ if st.session_state.analysis_performed:
 
     # Canal Interior Inferior (Vermelho Cheio)
     fig.add_trace(go.Scattergl(
-         x=st.session_state.regression_data.index,
-         y=st.session_state.regression_data['lower_inner_channel'],
+         x=channels_plot.index,
+         y=channels_plot['lower_inner_channel'],
          mode='lines',
          name='Canal Interior Inferior',
          showlegend=True,
@@ -222,8 +280,8 @@ if st.session_state.analysis_performed:
 
     # Canal Exterior Inferior (Vermelho Pontilhado)
     fig.add_trace(go.Scattergl(
-         x=st.session_state.regression_data.index,
-         y=st.session_state.regression_data['lower_outer_channel'],
+         x=channels_plot.index,
+         y=channels_plot['lower_outer_channel'],
          mode='lines',
          name='Canal Exterior Inferior',
          showlegend=True,
@@ -231,6 +289,52 @@ if st.session_state.analysis_performed:
      ))
     # --- Fim NOVOS ESTILOS DE LINHA ---
 
+    # Bandas de quantis (cinza tracejado): os quantis vêm do resultado em cache, calculados uma vez
+    if show_quantile_bands:
+        for column in [column for column in channels_plot.columns if column.startswith('band_p')]:
+            fig.add_trace(go.Scattergl(
+                x=channels_plot.index,
+                y=channels_plot[column],
+                mode='lines',
+                name=f"Banda de Quantil {column[len('band_p'):]}%",
+                line=dict(color='gray', width=1, dash='dash')
+            ))
+
+    # Cone de projeção: as cinco linhas do canal estendidas dia a dia após o último pregão
+    if projection_months > 0:
+        projection_path = analysis_module.project_log_channel_path(
+            regression.model,
+            regression.max_log_residual,
+            regression.min_log_residual,
+            len(regression),
+            max_horizon=projection_months * 21
+        )
+        if projection_path is not None:
+            last_date = regression.index[-1]
+            # Horizonte 0 coincide com o último pregão, ligando o cone ao histórico (mesmo num
+            # fim de semana, ex.: criptomoedas); o horizonte k ≥ 1 é o k-ésimo dia útil seguinte
+            projection_dates = pd.DatetimeIndex([last_date]).append(
+                pd.bdate_range(start=last_date + pd.offsets.BDay(1), periods=len(projection_path) - 1)
+            )
+            projection_colors = {
+                'Canal Exterior Superior': ('blue', 'dot'),
+                'Canal Interior Superior': ('blue', 'solid'),
+                'Linha Central': ('black', 'dot'),
+                'Canal Interior Inferior': ('red', 'solid'),
+                'Canal Exterior Inferior': ('red', 'dot'),
+            }
+            for line_name, (color, dash) in projection_colors.items():
+                fig.add_trace(go.Scattergl(
+                    x=projection_dates,
+                    y=projection_path[line_name],
+                    mode='lines',
+                    name=f'Projeção - {line_name}',
+                    legendgroup='projecao',
+                    showlegend=False,
+                    opacity=0.5,
+                    line=dict(color=color, width=1, dash=dash)
+                ))
+
 
     # Configurações do Layout do Gráfico de Preço
     fig.update_layout(
@@ -253,28 +357,45 @@ if st.session_state.analysis_performed:
     )
 
     # Exibir o gráfico de preço
-    st.plotly_chart(fig, use_container_width=True)
+    with instrumentation.span('plotly_chart'):
+        st.plotly_chart(fig, use_container_width=True)
 
 
     # --- 4. Visualização da Distribuição dos Resíduos ---
-    if st.session_state.log_residuals is not None and not st.session_state.log_residuals.empty:
+    if len(regression) > 0:
          st.subheader("Distribuição dos Resíduos Logarítmicos")
-
-         fig_residuals = px.histogram(st.session_state.log_residuals, nbins=50, labels={'value': 'Valor do Resíduo Logarítmico', 'count': 'Frequência'}, title='Histograma dos Resíduos Históricos')
-
-         if st.session_state.current_residual is not None:
-             fig_residuals.add_vline(x=st.session_state.current_residual, line_dash="dash", line_color="red", line_width=2, annotation_text=f"Resíduo Atual: {st.session_state.current_residual:.4f}", annotation_position="top right")
+         st.markdown(f"**Percentil do Resíduo Atual no Histórico:** {regression.residual_percentile:.1f}%")
+
+         # Contagens calculadas no servidor (e guardadas no resultado em cache): o navegador
+         # recebe só os 50 bins, qualquer que seja o tamanho do histórico
+         counts, edges = regression.residual_histogram(bins=RESIDUAL_HISTOGRAM_BINS)
+         fig_residuals = go.Figure(go.Bar(
+             x=(edges[:-1] + edges[1:]) / 2,
+             y=counts,
+             width=edges[1:] - edges[:-1],
+             name='Frequência',
+             showlegend=False,
+         ))
+         fig_residuals.update_layout(title='Histograma dos Resíduos Históricos', bargap=0)
+
+         if st.checkbox("Mostrar Densidade (KDE)", value=False):
+             grid, density = regression.residual_kde()
+             # Densidade na escala das contagens do histograma (n × largura do bin)
+             fig_residuals.add_trace(go.Scatter(x=grid, y=density * len(regression) * (edges[1] - edges[0]), mode='lines', name='KDE', line=dict(color='orange')))
+
+         fig_residuals.add_vline(x=regression.current_log_residual, line_dash="dash", line_color="red", line_width=2, annotation_text=f"Resíduo Atual: {regression.current_log_residual:.4f} (percentil {regression.residual_percentile:.0f})", annotation_position="top right")
 
          fig_residuals.update_layout(xaxis_title='Valor do Resíduo Logarítmico', yaxis_title='Frequência')
 
-         st.plotly_chart(fig_residuals, use_container_width=True)
+         with instrumentation.span('plotly_histogram'):
+             st.plotly_chart(fig_residuals, use_container_width=True)
 
     else:
          st.warning("Não foi possível gerar o histograma de resíduos (dados insuficientes ou erro no cálculo).")
 
 
     # --- 5. Projetar os Valores e Exibir a Tabela ---
-    if st.session_state.projection_table_prices is not None and st.session_state.current_actual_price is not None:
+    if analysis['projection_table_prices'] is not None:
         st.subheader("Projeção do Canal de Regressão Logarítmica")
 
         view_option = st.radio(
@@ -285,8 +406,10 @@ if st.session_state.analysis_performed:
         )
 
         if view_option == 'Preço Absoluto':
+            with instrumentation.span('format_table'):
+                formatted_table = analysis['projection_table_prices'].applymap(format_price)
             st.dataframe(
-                st.session_state.projection_table_prices.applymap(format_price),
+                formatted_table,
                 use_container_width=True
             )
             st.markdown("""
@@ -294,16 +417,18 @@ if st.session_state.analysis_performed:
             """, unsafe_allow_html=True)
 
         elif view_option == 'Variação Percentual':
-            if st.session_state.current_actual_price == 0:
+            if regression.current_actual_price == 0:
                  st.error("Não é possível calcular variação percentual: o preço atual é zero.")
             else:
                 # Calcular a variação percentual em relação ao preço atual REAL salvo
                 projection_table_percent = (
-                    (st.session_state.projection_table_prices - st.session_state.current_actual_price) / st.session_state.current_actual_price
+                    (analysis['projection_table_prices'] - regression.current_actual_price) / regression.current_actual_price
                 ) * 100
 
+                with instrumentation.span('format_table'):
+                    formatted_table = projection_table_percent.applymap(format_percentage)
                 st.dataframe(
-                    projection_table_percent.applymap(format_percentage),
+                    formatted_table,
                     use_container_width=True
                 )
                 st.markdown("""
@@ -320,6 +445,61 @@ if st.session_state.analysis_performed:
          st.warning("Não foi possível calcular a projeção do canal.")
 
 
+    # --- 6. Sensibilidade à Data de Início ---
+    # Recalcula o canal para todas as datas de início do período (somas de prefixo, custo O(N))
+    with st.expander("Sensibilidade à Data de Início"):
+        # Janelas com menos de ~3 meses de pregões geram taxas instáveis e são descartadas
+        with instrumentation.span('start_date_sweep'):
+            start_date_sweep = analysis_module.sweep_start_dates(regression.close.to_frame(), min_points=63)
+
+        if start_date_sweep is None or start_date_sweep.empty:
+            st.warning("Não há dados suficientes para a análise de sensibilidade à data de início.")
+        else:
+            st.markdown("""
+            <small><i>Cada ponto mostra o resultado da regressão se a análise começasse naquela data,
+            mantendo a mesma data de fim.</i></small>
+            """, unsafe_allow_html=True)
+
+            col_growth, col_residual = st.columns(2)
+
+            fig_sweep_growth = go.Figure(go.Scattergl(
+                x=start_date_sweep.index,
+                y=start_date_sweep['annualized_growth_rate'],
+                mode='lines',
+                name='Taxa de Crescimento Anualizada',
+                line=dict(color='black', width=1)
+            ))
+            fig_sweep_growth.update_layout(
+                title='Taxa de Crescimento Anualizada por Data de Início',
+                xaxis_title='Data de Início',
+                yaxis_title='Taxa de Crescimento (%)',
+                margin=dict(l=0, r=0, t=50, b=0),
+                height=350
+            )
+            col_growth.plotly_chart(fig_sweep_growth, use_container_width=True)
+
+            fig_sweep_residual = go.Figure(go.Scattergl(
+                x=start_date_sweep.index,
+                y=start_date_sweep['current_log_residual'],
+                mode='lines',
+                name='Resíduo Atual',
+                line=dict(color='red', width=1)
+            ))
+            fig_sweep_residual.update_layout(
+                title='Resíduo Logarítmico Atual por Data de Início',
+                xaxis_title='Data de Início',
+                yaxis_title='Resíduo Logarítmico Atual',
+                margin=dict(l=0, r=0, t=50, b=0),
+                height=350
+            )
+            col_residual.plotly_chart(fig_sweep_residual, use_container_width=True)
+
+
+elif analysis is not None:
+    # O resultado expirou do cache e não pôde ser recalculado (ex.: falha de rede)
+    st.warning("Não foi possível recarregar a análise. Clique em 'Analisar Ação' novamente.")
+
+
 # --- Informações Adicionais (Opcional) ---
 # Este bloco roda a cada rerun
 st.markdown("""
@@ -330,4 +510,32 @@ históricos em torno dessa tendência. A projeção estende essa tendência
 e amplitude para o futuro. O histograma mostra a distribuição estatística
 desses desvios. Essas ferramentas são para análise técnica e não devem ser
 interpretadas como recomendações de investimento.
-""")
\ No newline at end of file
+""")
+
+
+# --- Instrumentação: encerra o trace desta execução ---
+# Uma linha JSON por análise (clique no botão) vai para o logger log_ret.metrics
+finished_trace = instrumentation.finish_trace(run_trace, log=analyze_button)
+
+if debug_panel and finished_trace is not None:
+    with st.sidebar.expander("Tempos da Última Execução", expanded=True):
+        spans = finished_trace['spans']
+        st.markdown(f"**Total:** {finished_trace['total_ms']:.1f} ms")
+        if spans:
+            # Cascata: cada barra começa no início relativo da etapa e dura o tempo medido
+            fig_waterfall = go.Figure(go.Bar(
+                y=[span['name'] for span in spans],
+                x=[span['duration_ms'] for span in spans],
+                base=[span['start_ms'] for span in spans],
+                orientation='h',
+                marker_color='gray',
+                hovertemplate='%{y}: %{x:.1f} ms<extra></extra>'
+            ))
+            fig_waterfall.update_layout(
+                xaxis_title='ms desde o início da execução',
+                yaxis=dict(autorange='reversed'),
+                margin=dict(l=0, r=0, t=10, b=0),
+                height=40 + 22 * len(spans)
+            )
+            st.plotly_chart(fig_waterfall, use_container_width=True)
+        st.json(finished_trace, expanded=False)
@@ -0,0 +1,184 @@
+# batch_cli.py
+"""
+Execução em lote, sem interface, do canal de regressão logarítmica para uma lista de tickers.
+
+Lê os tickers de um arquivo (um por linha; linhas vazias e iniciadas por '#' são ignoradas),
+distribui-os em blocos por um pool de processos e grava uma linha de resumo por ticker
+(veja analysis_module.summarize_analysis) à medida que cada bloco termina.
+
+Cada bloco vira um arquivo part-*.parquet (ou .csv) gravado de forma atômica no diretório
+de saída; ao reiniciar após uma falha, os tickers já presentes nesses arquivos são pulados.
+Ao final, todas as partes são consolidadas em summary.parquet (ou summary.csv).
+
+Com --warm-info apenas preenche o cache de informações das empresas (nome, capitalização).
+
+Exemplos:
+    python batch_cli.py tickers.txt --output resultados --workers 8 --chunk-size 25
+    python batch_cli.py tickers.txt --warm-info
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import pandas as pd
+
+import analysis_module
+
+
+def read_tickers(path):
+    """Lê a lista de tickers (maiúsculos, sem repetição, na ordem do arquivo)."""
+    with open(path, encoding='utf-8') as f:
+        tickers = [line.split('#', 1)[0].strip().upper() for line in f]
+    return list(dict.fromkeys(ticker for ticker in tickers if ticker))
+
+
+def _part_paths(output_dir, output_format):
+    return sorted(glob.glob(os.path.join(output_dir, f"part-*.{output_format}")))
+
+
+def _read_part(path, output_format):
+    if output_format == 'parquet':
+        return pd.read_parquet(path)
+    # Tickers como 'NA' ou 'NULL' não podem virar NaN na releitura: só a célula vazia
+    # (como to_csv grava NaN) é valor ausente
+    return pd.read_csv(path, dtype={'ticker': str}, keep_default_na=False, na_values=[''])
+
+
+def completed_tickers(output_dir, output_format, retry_failed=False):
+    """Tickers já gravados nas partes existentes (com retry_failed, só os que deram 'ok')."""
+    done = set()
+    for path in _part_paths(output_dir, output_format):
+        try:
+            part = _read_part(path, output_format)
+        except Exception as e:
+            print(f"Aviso: parte ilegível ignorada ({path}): {e}")
+            continue
+        if retry_failed:
+            part = part[part['status'] == 'ok']
+        done.update(part['ticker'])
+    return done
+
+
+def write_part(rows, output_dir, output_format, part_name):
+    """Grava as linhas de um bloco como uma parte, de forma atômica (arquivo temporário + os.replace)."""
+    path = os.path.join(output_dir, f"{part_name}.{output_format}")
+    tmp_path = f"{path}.tmp"
+    frame = pd.DataFrame(rows)
+    if output_format == 'parquet':
+        frame.to_parquet(tmp_path, index=False)
+    else:
+        frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def analyze_chunk(tickers, start_date, end_date):
+    """Executado em cada processo do pool: busca, regressão e projeção de um bloco de tickers."""
+    rows = []
+    for ticker in tickers:
+        try:
+            analysis = analysis_module.run_analysis(ticker, start_date, end_date)
+            rows.append(analysis_module.summarize_analysis(analysis))
+        except Exception as e:
+            # Um ticker problemático não derruba o bloco inteiro
+            print(f"Erro inesperado ao analisar '{ticker}': {e}")
+            rows.append({'ticker': ticker, 'start_date': str(start_date), 'end_date': str(end_date), 'status': 'unexpected_error',
+                         'error_message': f"{type(e).__name__}: {e}"})
+    return rows
+
+
+def consolidate(output_dir, output_format):
+    """
+    Junta todas as partes num único arquivo summary.<formato>. Se um ticker aparece em mais
+    de uma parte (ex.: reprocessado com --retry-failed), prevalece a parte mais recente.
+    """
+    parts = [_read_part(path, output_format) for path in _part_paths(output_dir, output_format)]
+    if not parts:
+        return None
+    summary = pd.concat(parts, ignore_index=True).drop_duplicates(subset='ticker', keep='last')
+    path = os.path.join(output_dir, f"summary.{output_format}")
+    tmp_path = f"{path}.tmp"
+    if output_format == 'parquet':
+        summary.to_parquet(tmp_path, index=False)
+    else:
+        summary.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    today = date.today()
+    parser = argparse.ArgumentParser(description="Canal de regressão logarítmica em lote, sem interface.")
+    parser.add_argument('tickers_file', help="Arquivo com um ticker por linha.")
+    parser.add_argument('--start', default=(today - timedelta(days=5 * 365)).isoformat(), help="Data de início (AAAA-MM-DD). Padrão: 5 anos atrás.")
+    parser.add_argument('--end', default=today.isoformat(), help="Data de fim (AAAA-MM-DD, exclusiva). Padrão: hoje.")
+    parser.add_argument('--output', default='batch_results', help="Diretório de saída.")
+    parser.add_argument('--format', choices=('parquet', 'csv'), default='parquet', help="Formato dos arquivos de saída.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Número de processos.")
+    parser.add_argument('--chunk-size', type=int, default=20, help="Tickers por bloco enviado a cada processo.")
+    parser.add_argument('--retry-failed', action='store_true', help="Reprocessa tickers gravados com erro.")
+    parser.add_argument('--data-dir', help="Lê os preços de arquivos locais (<TICKER>.parquet/.csv) neste diretório em vez do Yahoo Finance.")
+    parser.add_argument('--warm-info', action='store_true', help="Só preenche o cache de informações das empresas e sai.")
+    parser.add_argument('--force', action='store_true', help="Com --warm-info, busca também os tickers ainda válidos no cache.")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        # Lida por data_providers.get_default_provider, aqui e nos processos do pool
+        os.environ['LOG_RET_DATA_DIR'] = os.path.abspath(args.data_dir)
+
+    if args.warm_info:
+        tickers = read_tickers(args.tickers_file)
+        infos = analysis_module.warm_stock_info(tickers, max_workers=args.workers, force=args.force)
+        failed = [ticker for ticker, info in infos.items() if info is None]
+        print(f"Cache de informações: {len(infos)} tickers buscados, {len(tickers) - len(infos)} já válidos, {len(failed)} com erro.")
+        return 1 if failed else 0
+
+    start_date, end_date = date.fromisoformat(args.start), date.fromisoformat(args.end)
+    if start_date >= end_date:
+        print("Erro: A data de início deve ser anterior à data de fim.")
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    tickers = read_tickers(args.tickers_file)
+    done = completed_tickers(args.output, args.format, args.retry_failed)
+    pending = [ticker for ticker in tickers if ticker not in done]
+    print(f"{len(tickers)} tickers, {len(tickers) - len(pending)} já processados, {len(pending)} pendentes.")
+
+    chunks = [pending[i:i + args.chunk_size] for i in range(0, len(pending), args.chunk_size)]
+    run_id = time.strftime('%Y%m%d%H%M%S')
+    processed = 0
+    t0 = time.perf_counter()
+
+    # 'spawn' evita herdar do processo pai threads e sessões HTTP num estado inconsistente
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {
+            executor.submit(analyze_chunk, chunk, start_date, end_date): index
+            for index, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                # Processo do bloco morreu: os tickers ficam pendentes para a próxima execução
+                print(f"Erro: bloco {index} falhou ({e}); seus tickers serão tentados na próxima execução.")
+                continue
+            write_part(rows, args.output, args.format, f"part-{run_id}-{index:05d}")
+            processed += len(rows)
+            failed = sum(row['status'] != 'ok' for row in rows)
+            print(f"[{processed}/{len(pending)}] bloco {index} gravado ({failed} com erro), {time.perf_counter() - t0:.1f}s.")
+
+    summary_path = consolidate(args.output, args.format)
+    if summary_path:
+        print(f"Resumo consolidado em {summary_path}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+# benchmark.py
+"""
+Benchmarks offline do analysis_module, sem acesso à rede.
+
+Gera preços sintéticos por movimento browniano geométrico (com NaNs e lacunas injetados),
+serve-os por um downloader falso e mede, para cada etapa e tamanho de série,
+o tempo de parede, o pico de memória e os blocos alocados.
+
+Exemplos:
+    python benchmark.py --quick
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --compare benchmark_baseline.json --tolerance 1.5
+    python benchmark.py --import-time --max-import-ms 1000
+"""
+
+import argparse
+import contextlib
+import gc
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import analysis_module
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+QUICK_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_TICKER_COUNTS = [10, 100, 800]
+QUICK_TICKER_COUNTS = [10, 100]
+# Barras por ticker nos benchmarks de lote (~20 anos de pregões)
+BATCH_BARS = 5_000
+
+
+def generate_gbm_prices(n_bars, n_tickers=1, seed=0, mu=0.08, sigma=0.3,
+                        nan_fraction=0.0, gap_fraction=0.0, gap_length=20, start='2000-01-03'):
+    """
+    Preços sintéticos por movimento browniano geométrico, reprodutíveis pela semente.
+    mu e sigma são anuais (252 pregões). nan_fraction marca pregões isolados como NaN;
+    gap_fraction marca blocos de gap_length pregões seguidos (ex.: suspensões).
+    Séries longas demais para datas diárias usam frequência de 1 minuto.
+    Retorna um DataFrame largo (datas × tickers T0000, T0001, ...).
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1 / analysis_module.TRADING_DAYS_PER_YEAR
+    log_returns = rng.normal((mu - sigma ** 2 / 2) * dt, sigma * np.sqrt(dt), size=(n_bars, n_tickers))
+    log_returns[0] = np.log(rng.uniform(5, 200, size=n_tickers))
+    prices = np.exp(np.cumsum(log_returns, axis=0))
+
+    if nan_fraction > 0:
+        prices[rng.random(prices.shape) < nan_fraction] = np.nan
+    if gap_fraction > 0:
+        n_gaps = int(n_bars * gap_fraction / gap_length)
+        for column in range(n_tickers):
+            for gap_start in rng.integers(0, max(1, n_bars - gap_length), size=n_gaps):
+                prices[gap_start:gap_start + gap_length, column] = np.nan
+
+    freq = 'B' if n_bars <= 50_000 else 'min'
+    index = pd.date_range(start, periods=n_bars, freq=freq, name='Date')
+    columns = pd.Index([f"T{i:04d}" for i in range(n_tickers)], name='Ticker')
+    return pd.DataFrame(prices, index=index, columns=columns)
+
+
+class StubDownloader:
+    """
+    Substituto do yf.download para get_stock_data / get_stock_data_batch.
+    Devolve o recorte [início, fim) dos preços sintéticos no mesmo formato do yfinance
+    (coluna 'Close' para um ticker, colunas MultiIndex (Price, Ticker) para uma lista).
+    """
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = 0
+
+    def __call__(self, tickers, start_date, end_date):
+        self.calls += 1
+        index = self.prices.index
+        window = self.prices[(index >= start_date) & (index < end_date)]
+        if isinstance(tickers, str):
+            return window[[tickers]].set_axis(['Close'], axis=1)
+        close = window[list(tickers)]
+        close.columns = pd.MultiIndex.from_product([['Close'], close.columns], names=['Price', 'Ticker'])
+        return close
+
+
+def measure(function, repeat=3):
+    """
+    Executa function repeat vezes para o melhor tempo de parede e mais uma vez sob
+    tracemalloc para o pico de memória e o número de blocos alocados que sobrevivem.
+    Retorna (resultado, métricas).
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - t0)
+
+    result = None
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = function()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    allocated_blocks = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+
+    return result, {
+        'wall_s': best,
+        'peak_mb': peak / 1024 ** 2,
+        'alloc_blocks': allocated_blocks,
+    }
+
+
+@contextlib.contextmanager
+def _silenced():
+    """Silencia os prints de aviso do analysis_module (preparação e medição)."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _quiet(function):
+    def wrapper():
+        with _silenced():
+            return function()
+    return wrapper
+
+
+def run_series_benchmarks(sizes, repeat):
+    """Etapas de um ticker (busca com e sem cache, regressão, projeções) para cada tamanho de série."""
+    results = []
+    for n_bars in sizes:
+        prices = generate_gbm_prices(n_bars, seed=n_bars, nan_fraction=0.001, gap_fraction=0.01)
+        stub = StubDownloader(prices)
+        ticker = prices.columns[0]
+        start, end = prices.index[0], prices.index[-1] + pd.Timedelta(days=1)
+        # Repetições menores para as séries gigantes, onde uma rodada já leva segundos
+        stage_repeat = repeat if n_bars < 1_000_000 else 1
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stages = {
+                'get_stock_data (sem cache)': lambda: analysis_module.get_stock_data(
+                    ticker, start, end, downloader=stub, use_cache=False),
+                'get_stock_data (cache frio)': lambda: analysis_module.get_stock_data(
+                    ticker, start, end, downloader=stub, cache_dir=tempfile.mkdtemp(dir=cache_dir)),
+            }
+            with _silenced():
+                stock_data = analysis_module.get_stock_data(ticker, start, end, downloader=stub, cache_dir=cache_dir)
+                regression = analysis_module.calculate_log_regression(stock_data)
+            stages['get_stock_data (cache quente)'] = lambda: analysis_module.get_stock_data(
+                ticker, start, end, downloader=stub, cache_dir=cache_dir)
+
+            stages['calculate_log_regression'] = lambda: analysis_module.calculate_log_regression(stock_data)
+            stages['calculate_log_regression (float32)'] = lambda: analysis_module.calculate_log_regression(stock_data, dtype=np.float32)
+
+            projection_args = (regression.model, regression.max_log_residual, regression.min_log_residual, len(regression))
+            stages['project_log_channel'] = lambda: analysis_module.project_log_channel(*projection_args)
+            stages['project_log_channel_path (5 anos)'] = lambda: analysis_module.project_log_channel_path(
+                *projection_args, max_horizon=5 * analysis_module.TRADING_DAYS_PER_YEAR)
+            stages['LogChannelResult.to_frame'] = lambda: regression.to_frame()
+
+            for stage, function in stages.items():
+                _, metrics = measure(_quiet(function), stage_repeat)
+                results.append({'benchmark': stage, 'n_bars': n_bars, 'n_tickers': 1, **metrics})
+                _print_row(results[-1])
+    return results
+
+
+def run_batch_benchmarks(ticker_counts, repeat):
+    """Busca em lote e regressão vetorizada para universos de tamanhos diferentes."""
+    results = []
+    for n_tickers in ticker_counts:
+        prices = generate_gbm_prices(BATCH_BARS, n_tickers, seed=n_tickers, nan_fraction=0.001, gap_fraction=0.01)
+        stub = StubDownloader(prices)
+        start, end = prices.index[0], prices.index[-1] + pd.Timedelta(days=1)
+
+        stages = {
+            'get_stock_data_batch': lambda: analysis_module.get_stock_data_batch(
+                list(prices.columns), start, end, downloader=stub),
+            'calculate_log_regression_batch': lambda: analysis_module.calculate_log_regression_batch(prices),
+        }
+        for stage, function in stages.items():
+            _, metrics = measure(_quiet(function), repeat)
+            results.append({'benchmark': stage, 'n_bars': BATCH_BARS, 'n_tickers': n_tickers, **metrics})
+            _print_row(results[-1])
+    return results
+
+
+# Módulos do núcleo numérico e dependências pesadas que eles não podem carregar na importação
+CORE_MODULES = ['analysis_module', 'data_providers', 'downsampling', 'instrumentation', 'price_cache', 'price_store',
+                'quantile_sketch', 'result_cache']
+HEAVY_MODULES = ['yfinance', 'statsmodels', 'patsy', 'scipy', 'streamlit', 'plotly']
+
+
+def measure_import_time(module):
+    """
+    Importa module num processo novo com `python -X importtime` e retorna o tempo acumulado
+    da importação (ms) e a lista dos pacotes de primeiro nível carregados junto.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+    )
+    cumulative_us = None
+    packages = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue # cabeçalho
+        packages.add(name.strip().split('.')[0])
+        if name.strip() == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1000, sorted(packages)
+
+
+def _print_row(row):
+    print(f"{row['benchmark']:<40} {row['n_bars']:>10,} {row['n_tickers']:>6} "
+          f"{row['wall_s'] * 1000:>12.2f} ms {row['peak_mb']:>10.1f} MB {row['alloc_blocks']:>10,}")
+
+
+def _key(row):
+    return (row['benchmark'], row['n_bars'], row['n_tickers'])
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Compara tempo e pico de memória com a linha de base. Uma medição piora se passar de
+    tolerance vezes o valor de referência (tempos abaixo de 1 ms são ignorados, por ruído).
+    Retorna a lista de regressões encontradas.
+    """
+    reference = {_key(row): row for row in baseline['results']}
+    regressions = []
+    for row in results:
+        base = reference.get(_key(row))
+        if base is None:
+            continue
+        if row['wall_s'] > 1e-3 and row['wall_s'] > base['wall_s'] * tolerance:
+            regressions.append(f"{_key(row)}: tempo {row['wall_s'] * 1000:.2f} ms > {base['wall_s'] * 1000:.2f} ms × {tolerance}")
+        if row['peak_mb'] > 1 and row['peak_mb'] > base['peak_mb'] * tolerance:
+            regressions.append(f"{_key(row)}: memória {row['peak_mb']:.1f} MB > {base['peak_mb']:.1f} MB × {tolerance}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline do analysis_module.")
+    parser.add_argument('--quick', action='store_true', help="Apenas séries e universos pequenos.")
+    parser.add_argument('--sizes', type=int, nargs='+', help="Tamanhos de série (barras) a medir.")
+    parser.add_argument('--tickers', type=int, nargs='+', help="Quantidades de tickers nos benchmarks de lote.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetições para o melhor tempo.")
+    parser.add_argument('--save-baseline', metavar='ARQUIVO', help="Grava os resultados como linha de base (JSON).")
+    parser.add_argument('--compare', metavar='ARQUIVO', help="Compara com uma linha de base e falha se houver regressão.")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="Fator máximo aceito sobre a linha de base.")
+    parser.add_argument('--import-time', action='store_true', help="Só mede a importação do núcleo e falha se carregar dependências pesadas.")
+    parser.add_argument('--max-import-ms', type=float, help="Com --import-time, tempo máximo de importação por módulo.")
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        # A verificação é o teste test_core_import_time, habilitado por LOG_RET_IMPORT_TEST
+        os.environ['LOG_RET_IMPORT_TEST'] = '1'
+        if args.max_import_ms is not None:
+            os.environ['LOG_RET_IMPORT_MAX_MS'] = str(args.max_import_ms)
+        test_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'test_log_regression.py')
+        return importlib.import_module('pytest').main(['-q', '-s', f"{test_path}::test_core_import_time"])
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    ticker_counts = args.tickers or (QUICK_TICKER_COUNTS if args.quick else DEFAULT_TICKER_COUNTS)
+
+    print(f"{'benchmark':<40} {'barras':>10} {'tickers':>6} {'tempo':>15} {'pico':>13} {'blocos':>10}")
+    results = run_series_benchmarks(sizes, args.repeat) + run_batch_benchmarks(ticker_counts, args.repeat)
+
+    report = {
+        'created_at': pd.Timestamp.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Linha de base gravada em {args.save_baseline}.")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressões de desempenho encontradas:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("Nenhuma regressão de desempenho em relação à linha de base.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
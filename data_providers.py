@@ -0,0 +1,228 @@
+# data_providers.py
+
+import importlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+import price_cache
+
+
+class DataSourceError(Exception):
+    """Falha ao obter dados de um provedor (rede, arquivo ilegível, formato inesperado)."""
+
+    def __init__(self, message, ticker=None, provider=None):
+        super().__init__(message)
+        self.ticker = ticker
+        self.provider = provider
+
+
+class TickerNotFoundError(DataSourceError):
+    """O provedor não conhece o ticker pedido."""
+
+
+class DataProvider:
+    """
+    Interface das fontes de dados usadas por get_stock_data, get_stock_data_batch e get_stock_info.
+
+    fetch_history(tickers, início, fim) segue o formato do yf.download no intervalo [início, fim):
+    para um ticker (str), um DataFrame com a coluna 'Close' indexado por data; para uma lista,
+    colunas MultiIndex (Price, Ticker). Um intervalo sem pregões retorna um DataFrame vazio.
+    fetch_info(ticker) retorna um dict com ao menos os campos de info_cache.FIELD_TTLS.
+    Um provedor também pode ser passado diretamente como downloader (provider(tickers, início, fim)).
+    cacheable indica se vale guardar o histórico no cache Parquet local.
+    """
+    name = 'base'
+    cacheable = True
+
+    def fetch_history(self, tickers, start_date, end_date):
+        raise NotImplementedError
+
+    def fetch_info(self, ticker):
+        raise NotImplementedError
+
+    def __call__(self, tickers, start_date, end_date):
+        return self.fetch_history(tickers, start_date, end_date)
+
+
+class YahooProvider(DataProvider):
+    """
+    Yahoo Finance via yfinance (importado só no primeiro uso).
+    yf.download não é seguro entre threads: a cada chamada ele limpa e remonta os dicts
+    globais de yfinance.shared, e chamadas simultâneas misturam os tickers umas das outras.
+    Um ticker é buscado com Ticker.history (que não lê esses dicts) e roda em paralelo;
+    listas usam yf.download, uma chamada por vez no processo.
+    """
+    name = 'yahoo'
+
+    # Erro que o yfinance registra quando o intervalo simplesmente não tem pregões
+    _NO_PRICES_ERROR = 'no price data found'
+    # Serializa yf.download (e a leitura de shared._ERRORS) entre as threads do processo
+    _download_lock = threading.Lock()
+
+    def fetch_history(self, tickers, start_date, end_date):
+        yf = importlib.import_module('yfinance')
+        start, end = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+        if isinstance(tickers, str):
+            try:
+                return yf.Ticker(tickers).history(start=start, end=end, raise_errors=True)
+            except Exception as e:
+                if isinstance(e, importlib.import_module('yfinance.exceptions').YFPricesMissingError):
+                    # Intervalo sem pregões (ex.: fim de semana, antes do IPO): não é falha
+                    return pd.DataFrame()
+                raise DataSourceError(f"falha no download do Yahoo Finance: {e}", ticker=tickers, provider=self.name) from e
+
+        with self._download_lock:
+            try:
+                data = yf.download(list(tickers), start=start, end=end)
+            except Exception as e:
+                raise DataSourceError(f"falha no download do Yahoo Finance: {e}", ticker=tickers, provider=self.name) from e
+            # O yfinance não levanta exceção em falhas (ex.: limite de requisições): devolve
+            # colunas vazias e registra o erro em shared._ERRORS. Vazio por falha não pode
+            # ser confundido com um intervalo sem pregões.
+            errors = dict(importlib.import_module('yfinance.shared')._ERRORS)
+        failed = {
+            ticker: errors[ticker.upper()] for ticker in tickers
+            if ticker.upper() in errors and self._NO_PRICES_ERROR not in str(errors[ticker.upper()])
+        }
+        if failed and len(failed) == len(tickers):
+            detail = '; '.join(f"{ticker}: {error}" for ticker, error in failed.items())
+            raise DataSourceError(f"falha no download do Yahoo Finance: {detail}", ticker=tickers, provider=self.name)
+        return data
+
+    def fetch_info(self, ticker):
+        yf = importlib.import_module('yfinance')
+        try:
+            return yf.Ticker(ticker).info
+        except Exception as e:
+            raise DataSourceError(f"falha ao obter informações no Yahoo Finance: {e}", ticker=ticker, provider=self.name) from e
+
+
+class LocalFilesProvider(DataProvider):
+    """
+    Arquivos de fim de dia próprios: um arquivo por ticker (<TICKER>.parquet ou <TICKER>.csv,
+    com o nome de price_cache.safe_file_stem) num diretório, com as colunas de data e fechamento.
+    Vários tickers são lidos numa única varredura do pyarrow.dataset, só com as colunas de data
+    e fechamento (float64) e com o filtro de datas aplicado na leitura.
+    Informações das empresas vêm do arquivo opcional info.json ({ticker: {campo: valor}}).
+    O diretório do próprio cache Parquet (price_cache) também serve como fonte.
+    """
+    name = 'local'
+    # Os dados já são locais: guardá-los de novo no cache Parquet só duplicaria
+    cacheable = False
+
+    _FORMATS = {'.parquet': 'parquet', '.csv': 'csv'}
+
+    def __init__(self, directory, date_column='Date', close_column='Close'):
+        self.directory = directory
+        self.date_column = date_column
+        self.close_column = close_column
+        self._info = None
+
+    def _files(self, tickers):
+        """{ticker: caminho} dos tickers que têm arquivo (Parquet tem prioridade sobre CSV)."""
+        available = {}
+        for name in os.listdir(self.directory):
+            stem, extension = os.path.splitext(name)
+            if extension in self._FORMATS and (stem not in available or extension == '.parquet'):
+                available[stem] = os.path.join(self.directory, name)
+        return {
+            ticker: available[price_cache.safe_file_stem(ticker)]
+            for ticker in tickers if price_cache.safe_file_stem(ticker) in available
+        }
+
+    def _file_format(self, extension):
+        dataset = importlib.import_module('pyarrow.dataset')
+        if self._FORMATS[extension] == 'parquet':
+            return dataset.ParquetFileFormat()
+        pa = importlib.import_module('pyarrow')
+        csv = importlib.import_module('pyarrow.csv')
+        # A projeção do dataset já limita a conversão às colunas lidas; aqui só os tipos
+        return dataset.CsvFileFormat(convert_options=csv.ConvertOptions(
+            column_types={self.date_column: pa.timestamp('ns'), self.close_column: pa.float64()},
+        ))
+
+    def read_close(self, tickers, start_date, end_date):
+        """
+        Fechamentos de vários tickers em [start_date, end_date) como DataFrame largo
+        (datas × tickers, NaN onde o ticker não teve pregão). Tickers sem arquivo ficam de fora.
+        """
+        pa = importlib.import_module('pyarrow')
+        dataset = importlib.import_module('pyarrow.dataset')
+
+        files = self._files(tickers)
+        ticker_by_path = {path: ticker for ticker, path in files.items()}
+        date = dataset.field(self.date_column).cast(pa.timestamp('ns'))
+        date_filter = (date >= pa.scalar(pd.Timestamp(start_date).to_datetime64())) & (date < pa.scalar(pd.Timestamp(end_date).to_datetime64()))
+
+        frames = []
+        for extension in self._FORMATS:
+            paths = [path for path in files.values() if path.endswith(extension)]
+            if not paths:
+                continue
+            try:
+                # __filename é o campo especial do pyarrow com o arquivo de origem de cada linha
+                table = dataset.dataset(paths, format=self._file_format(extension)).to_table(
+                    columns=[self.date_column, self.close_column, '__filename'],
+                    filter=date_filter,
+                )
+            except Exception as e:
+                raise DataSourceError(f"falha ao ler arquivos locais em '{self.directory}': {e}", ticker=list(files), provider=self.name) from e
+            frames.append(pd.DataFrame({
+                'Date': pd.to_datetime(table.column(self.date_column).to_pandas()),
+                'Close': table.column(self.close_column).to_numpy().astype('float64', copy=False),
+                'Ticker': table.column('__filename').to_pandas().map(ticker_by_path),
+            }))
+
+        if not frames:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='Date'), columns=pd.Index([], name='Ticker'), dtype='float64')
+        close = pd.concat(frames, ignore_index=True)
+        close = close.drop_duplicates(subset=['Date', 'Ticker'], keep='last')
+        wide = close.pivot(index='Date', columns='Ticker', values='Close').sort_index()
+        return wide.reindex(columns=[ticker for ticker in tickers if ticker in files])
+
+    def fetch_history(self, tickers, start_date, end_date):
+        if isinstance(tickers, str):
+            wide = self.read_close([tickers], start_date, end_date)
+            if tickers not in wide.columns:
+                raise TickerNotFoundError(f"nenhum arquivo para '{tickers}' em '{self.directory}'", ticker=tickers, provider=self.name)
+            return wide[[tickers]].set_axis(['Close'], axis=1).dropna()
+        wide = self.read_close(list(tickers), start_date, end_date)
+        wide.columns = pd.MultiIndex.from_product([['Close'], wide.columns], names=['Price', 'Ticker'])
+        return wide
+
+    def fetch_info(self, ticker):
+        if self._info is None:
+            path = os.path.join(self.directory, 'info.json')
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._info = {key.upper(): value for key, value in json.load(f).items()}
+            except FileNotFoundError:
+                self._info = {}
+            except Exception as e:
+                raise DataSourceError(f"info.json ilegível em '{self.directory}': {e}", ticker=ticker, provider=self.name) from e
+        info = self._info.get(ticker.upper())
+        if info is None:
+            raise TickerNotFoundError(f"sem informações para '{ticker}' em '{self.directory}'", ticker=ticker, provider=self.name)
+        return info
+
+
+_default_provider = None
+_default_provider_key = None
+_default_provider_lock = threading.Lock()
+
+
+def get_default_provider():
+    """
+    Provedor padrão do processo: LocalFilesProvider sobre LOG_RET_DATA_DIR, se definida,
+    ou o YahooProvider. A variável é lida a cada chamada (o lote a define antes de abrir os processos).
+    """
+    global _default_provider, _default_provider_key
+    data_dir = os.environ.get('LOG_RET_DATA_DIR') or None
+    with _default_provider_lock:
+        if _default_provider is None or _default_provider_key != data_dir:
+            _default_provider = LocalFilesProvider(data_dir) if data_dir else YahooProvider()
+            _default_provider_key = data_dir
+        return _default_provider
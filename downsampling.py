@@ -0,0 +1,64 @@
+# downsampling.py
+
+import numpy as np
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: escolhe n_out índices de (x, y) que preservam
+    a forma visual da série. O primeiro e o último ponto são sempre mantidos; de cada
+    bucket intermediário fica o ponto que forma o maior triângulo com o ponto escolhido
+    no bucket anterior e a média do bucket seguinte.
+    x e y são arrays 1-D numéricos do mesmo tamanho (datas podem ser passadas como int64).
+    Retorna um array crescente de índices; se a série já cabe em n_out, retorna todos.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Limites dos n_out - 2 buckets intermediários (o primeiro e o último ponto ficam de fora)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Médias de cada bucket via somas acumuladas (a do último "bucket" é o último ponto)
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = edges[1:] - edges[:-1]
+    mean_x = np.append((cum_x[edges[1:]] - cum_x[edges[:-1]]) / counts, x[-1])
+    mean_y = np.append((cum_y[edges[1:]] - cum_y[edges[:-1]]) / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        # O dobro da área do triângulo (a, b, média do próximo bucket) para cada b do bucket
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+
+def downsample_channel_plot(df_plot, max_points, channel_points=None):
+    """
+    Reduz o DataFrame de plotagem de calculate_log_regression para envio ao navegador.
+    O fechamento passa por LTTB em escala logarítmica (a mesma do gráfico) com até max_points pontos.
+    As linhas do canal são retas em log e não precisam de resolução: ficam com
+    channel_points pontos igualmente espaçados, incluindo as extremidades (padrão max_points // 16).
+    Como o eixo x é de datas de calendário e a reta é no índice de pregões, as extremidades
+    sozinhas desviariam um pouco nos feriados; pontos intermediários mantêm a linha exata.
+    Retorna (close, channels): dois DataFrames com o mesmo índice de datas do original.
+    """
+    n = len(df_plot)
+    close_idx = lttb_indices(df_plot.index.asi8, np.log(df_plot['Close'].to_numpy(dtype=np.float64) + 1e-9), max_points)
+
+    channel_points = channel_points or max(2, max_points // 16)
+    channel_idx = np.unique(np.linspace(0, n - 1, min(n, channel_points)).astype(np.int64))
+
+    return df_plot[['Close']].iloc[close_idx], df_plot.drop(columns='Close').iloc[channel_idx]
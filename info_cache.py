@@ -0,0 +1,83 @@
+# info_cache.py
+
+import contextlib
+import json
+import os
+import sqlite3
+import time
+
+# Banco SQLite do cache de informações das empresas (um registro por ticker e campo).
+# Pode ser sobrescrito pela variável de ambiente LOG_RET_INFO_CACHE.
+DEFAULT_DB_PATH = os.environ.get(
+    'LOG_RET_INFO_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'log_ret', 'info.sqlite3')
+)
+
+# Campos do .info do yfinance que o app usa e por quanto tempo (segundos) cada um vale.
+# Só esses campos são gravados; o nome quase nunca muda, a capitalização muda todo dia.
+FIELD_TTLS = {
+    'longName': 30 * 24 * 3600,
+    'marketCap': 24 * 3600,
+}
+# Campo ausente no provedor (ex.: ETFs sem marketCap) também é guardado, com a validade
+# mais curta, para não repetir a busca a cada análise nem esconder uma falha passageira por meses
+_MISSING_TTL = min(FIELD_TTLS.values())
+
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=10)
+    # WAL permite leituras de outros processos (workers do app, lote) durante uma escrita
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS info ('
+        ' ticker TEXT NOT NULL, field TEXT NOT NULL, value TEXT, fetched_at REAL NOT NULL,'
+        ' PRIMARY KEY (ticker, field))'
+    )
+    return connection
+
+
+def project_info(info):
+    """Mantém só os campos de FIELD_TTLS (ausentes viram None)."""
+    return {field: (info or {}).get(field) for field in FIELD_TTLS}
+
+
+def load_info(ticker, db_path=None, now=None):
+    """
+    Lê as informações em cache de um ticker.
+    Retorna (dict campo -> valor com os campos encontrados, conjunto dos campos vencidos ou
+    ausentes). Sem cache utilizável retorna ({}, todos os campos).
+    """
+    now = time.time() if now is None else now
+    try:
+        with contextlib.closing(_connect(db_path or DEFAULT_DB_PATH)) as connection:
+            rows = connection.execute(
+                'SELECT field, value, fetched_at FROM info WHERE ticker = ?', (ticker.upper(),)
+            ).fetchall()
+    except Exception as e:
+        print(f"Aviso: cache de informações ilegível para '{ticker}' ({e}).")
+        return {}, set(FIELD_TTLS)
+
+    values = {}
+    stale = set(FIELD_TTLS)
+    for field, value, fetched_at in rows:
+        if field not in FIELD_TTLS:
+            continue
+        values[field] = json.loads(value)
+        ttl = FIELD_TTLS[field] if values[field] is not None else _MISSING_TTL
+        if now - fetched_at < ttl:
+            stale.discard(field)
+    return values, stale
+
+
+def save_info(ticker, info, db_path=None, now=None):
+    """Grava os campos projetados de info para o ticker. Falhas de escrita apenas geram aviso."""
+    now = time.time() if now is None else now
+    rows = [(ticker.upper(), field, json.dumps(value), now) for field, value in project_info(info).items()]
+    try:
+        with contextlib.closing(_connect(db_path or DEFAULT_DB_PATH)) as connection, connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO info (ticker, field, value, fetched_at) VALUES (?, ?, ?, ?)', rows
+            )
+    except Exception as e:
+        print(f"Aviso: não foi possível gravar o cache de informações para '{ticker}': {e}")
@@ -0,0 +1,178 @@
+# instrumentation.py
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+# Instrumentação ligada para todo o processo (LOG_RET_TRACE=1). Sem ela, um trace só é
+# aberto quando pedido explicitamente (ex.: painel de depuração do app).
+ENABLED = os.environ.get('LOG_RET_TRACE', '0') not in ('', '0')
+# Medição de memória por etapa via tracemalloc (bem mais cara que só o tempo)
+MEMORY_ENABLED = os.environ.get('LOG_RET_TRACE_MEMORY', '0') not in ('', '0')
+if MEMORY_ENABLED and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# Uma linha JSON por análise neste logger; LOG_RET_TRACE_LOG direciona para um arquivo
+logger = logging.getLogger('log_ret.metrics')
+if not logger.handlers:
+    _handler = logging.FileHandler(os.environ['LOG_RET_TRACE_LOG']) if os.environ.get('LOG_RET_TRACE_LOG') else logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_trace = contextvars.ContextVar('log_ret_trace', default=None)
+
+
+class _NullSpan:
+    """Span usado quando não há trace ativo: entrar e sair não fazem nada."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Registro das etapas (spans) de uma execução, com início relativo e duração em ms."""
+
+    def __init__(self, name, memory=False, **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.end = None
+        self.spans = []
+        self.memory = memory and tracemalloc.is_tracing()
+        self._memory_stack = []
+        self._token = None
+
+    def to_dict(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            'event': 'analysis_trace',
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'total_ms': (end - self.start) * 1000,
+            'attributes': self.attributes,
+            'spans': sorted(self.spans, key=lambda span: span['start_ms']),
+        }
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        if self.trace.memory:
+            stack = self.trace._memory_stack
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            stack.append([current, current])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        record = {
+            'name': self.name,
+            'start_ms': (self.start - self.trace.start) * 1000,
+            'duration_ms': (end - self.start) * 1000,
+            'thread': threading.current_thread().name,
+        }
+        if exc_info[0] is not None:
+            record['error'] = exc_info[0].__name__
+        if self.trace.memory and self.trace._memory_stack:
+            # O pico de uma etapa inclui os das etapas internas (propagado ao sair delas)
+            stack = self.trace._memory_stack
+            current, peak = tracemalloc.get_traced_memory()
+            start, peak_seen = stack.pop()
+            own_peak = max(peak_seen, peak)
+            if stack:
+                stack[-1][1] = max(stack[-1][1], own_peak)
+            record['mem_delta_kb'] = (current - start) / 1024
+            record['mem_peak_kb'] = (own_peak - start) / 1024
+        self.trace.spans.append(record)
+        return False
+
+
+def span(name):
+    """
+    Marca uma etapa do trace ativo: `with instrumentation.span('ols_fit'): ...`.
+    Sem trace ativo devolve um objeto nulo compartilhado (custo de uma leitura de ContextVar).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+
+def start_trace(name, enabled=None, **attributes):
+    """
+    Abre um trace e o torna ativo no contexto atual. enabled=None segue LOG_RET_TRACE.
+    Retorna o Trace ou None (instrumentação desligada).
+    """
+    if not (ENABLED if enabled is None else enabled):
+        # Descarta um trace deixado ativo por uma execução interrompida neste contexto
+        _current_trace.set(None)
+        return None
+    trace = Trace(name, memory=MEMORY_ENABLED, **attributes)
+    trace._token = _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace, log=True):
+    """
+    Fecha o trace, grava a linha JSON em log_ret.metrics (se log=True) e retorna o dict do trace.
+    Aceita None (instrumentação desligada) e retorna None.
+    """
+    if trace is None:
+        return None
+    trace.end = time.perf_counter()
+    if trace._token is not None:
+        try:
+            _current_trace.reset(trace._token)
+        except ValueError:
+            # Fechado em outro contexto: apenas desativa o trace aqui
+            _current_trace.set(None)
+        trace._token = None
+    record = trace.to_dict()
+    if log:
+        logger.info(json.dumps(record, default=str))
+    return record
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def bind(function):
+    """
+    Faz function rodar com o trace ativo mesmo em outra thread (ex.: pool de rede).
+    Sem trace ativo devolve a própria função.
+    """
+    if _current_trace.get() is None:
+        return function
+    context = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return bound
@@ -0,0 +1,202 @@
+# price_cache.py
+
+import os
+import re
+import uuid
+from datetime import date
+
+import pandas as pd
+
+# Diretório padrão do cache local de preços (um arquivo Parquet por ticker).
+# Pode ser sobrescrito pela variável de ambiente LOG_RET_CACHE_DIR.
+DEFAULT_CACHE_DIR = os.environ.get(
+    'LOG_RET_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'log_ret', 'prices')
+)
+
+# Chaves de metadados gravadas junto da série (DataFrame.attrs é preservado no Parquet).
+# Guardam o intervalo [início, fim) já consultado no provedor, que pode ser maior que o
+# intervalo com pregões (ex.: datas anteriores ao IPO), evitando downloads repetidos.
+_COVERED_START_KEY = 'covered_start'
+_COVERED_END_KEY = 'covered_end'
+# Momento do download completo que originou a série: complementos não o alteram
+_FETCHED_AT_KEY = 'fetched_at'
+
+# Idade máxima do cache desde o download completo. O fechamento do provedor é ajustado por
+# desdobramentos e proventos; a verificação do pregão de sobreposição (adjustment_changed)
+# detecta reajustes nos complementos, e esta idade é a garantia para o que ela não vê.
+# Pode ser sobrescrita pela variável de ambiente LOG_RET_CACHE_MAX_AGE_DAYS.
+MAX_CACHE_AGE = pd.Timedelta(days=float(os.environ.get('LOG_RET_CACHE_MAX_AGE_DAYS', 30)))
+
+# Diferença relativa máxima entre o fechamento em cache e o baixado de novo no mesmo pregão
+ADJUSTMENT_TOLERANCE = 1e-4
+
+
+def safe_file_stem(ticker):
+    """
+    Nome de arquivo (sem extensão) de um ticker: maiúsculo, com caracteres fora de
+    [A-Za-z0-9._-] (ex.: '^' em '^BVSP') substituídos por '_'.
+    """
+    return re.sub(r'[^A-Za-z0-9._-]', '_', ticker.upper())
+
+
+def temporary_path(path):
+    """
+    Caminho temporário exclusivo ao lado de path para escrita atômica (gravar + os.replace).
+    O sufixo aleatório evita que threads do mesmo processo (ou processos) compartilhem o arquivo.
+    """
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+def cache_path(ticker, cache_dir=None):
+    """Retorna o caminho do arquivo de cache para um ticker."""
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"{safe_file_stem(ticker)}.parquet")
+
+
+def load_cached_close(ticker, cache_dir=None, max_age=None):
+    """
+    Lê a série de fechamento em cache de um ticker.
+    Retorna (DataFrame com a coluna 'Close', início coberto, fim coberto, momento do download
+    completo) ou (None, None, None, None) se não houver cache válido ou se ele tiver mais
+    que max_age (padrão MAX_CACHE_AGE) desde o download completo.
+    """
+    path = cache_path(ticker, cache_dir)
+    if not os.path.exists(path):
+        return None, None, None, None
+    try:
+        cached = pd.read_parquet(path)
+        covered_start = pd.Timestamp(cached.attrs[_COVERED_START_KEY])
+        covered_end = pd.Timestamp(cached.attrs[_COVERED_END_KEY])
+        fetched_at = cached.attrs.get(_FETCHED_AT_KEY)
+        fetched_at = pd.Timestamp(fetched_at) if fetched_at is not None else None
+    except Exception as e:
+        print(f"Aviso: cache de preços ilegível para '{ticker}' ({e}). Os dados serão baixados novamente.")
+        return None, None, None, None
+    # Sem o momento do download (cache de versões anteriores) não há como saber a idade: vencido
+    if fetched_at is None or pd.Timestamp.now() - fetched_at > (MAX_CACHE_AGE if max_age is None else max_age):
+        return None, None, None, None
+    cached.attrs = {}
+    return cached[['Close']], covered_start, covered_end, fetched_at
+
+
+def save_cached_close(ticker, close_data, covered_start, covered_end, cache_dir=None, fetched_at=None):
+    """
+    Grava a série de fechamento de um ticker, o intervalo coberto e o momento do download
+    completo (padrão: agora; complementos repassam o valor lido do cache).
+    A escrita é atômica (arquivo temporário + os.replace) para que leitores concorrentes
+    nunca vejam um arquivo parcial. Falhas de escrita apenas geram aviso.
+    """
+    path = cache_path(ticker, cache_dir)
+    tmp_path = temporary_path(path)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        to_save = close_data[['Close']].copy()
+        to_save.attrs = {
+            _COVERED_START_KEY: pd.Timestamp(covered_start).isoformat(),
+            _COVERED_END_KEY: pd.Timestamp(covered_end).isoformat(),
+            _FETCHED_AT_KEY: pd.Timestamp(pd.Timestamp.now() if fetched_at is None else fetched_at).isoformat(),
+        }
+        to_save.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Aviso: não foi possível gravar o cache de preços para '{ticker}': {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def missing_ranges(covered_start, covered_end, start, end):
+    """
+    Calcula os intervalos [início, fim) que faltam no cache para atender [start, end).
+    Retorna no máximo dois intervalos (cabeça e cauda). A cauda sempre parte do fim coberto,
+    mesmo que o pedido comece depois dele, para manter a cobertura contígua.
+    """
+    if covered_start is None or covered_end is None:
+        return [(start, end)]
+
+    ranges = []
+    if start < covered_start:
+        ranges.append((start, covered_start))
+    if end > covered_end:
+        ranges.append((covered_end, end))
+    return ranges
+
+
+# Intervalos que terminam a menos destes dias de hoje ainda podem ganhar pregões (ou ter
+# voltado vazios por falha temporária do provedor): só contam até o último pregão recebido
+RECENT_RANGE_DAYS = 7
+
+
+def proven_range(range_start, range_end, new_data, head=False):
+    """
+    Parte de [range_start, range_end) que um download comprova, para estender a cobertura.
+    Um download vazio só comprova um intervalo de cabeça antigo (ex.: antes do IPO); na cauda,
+    vazio pode ser limite de requisições ou falha silenciosa, e não comprova nada (retorna None).
+    Com dados, o intervalo vale inteiro se for antigo; se for recente, só até o último pregão.
+    """
+    recent = range_end > coverage_end_limit() - pd.Timedelta(days=RECENT_RANGE_DAYS)
+    if new_data is None or new_data.empty:
+        return (range_start, range_end) if head and not recent else None
+    if not recent:
+        return range_start, range_end
+    return range_start, min(range_end, pd.Timestamp(new_data.index[-1]).normalize() + pd.Timedelta(days=1))
+
+
+def overlap_range(cached, covered_start, covered_end, range_start, range_end):
+    """
+    Amplia o intervalo de complemento [range_start, range_end) para incluir um pregão já em
+    cache: o último antes do fim coberto (na cauda) ou o primeiro do cache (na cabeça).
+    Comparar esse pregão nos dois downloads revela reajustes (veja adjustment_changed).
+    Retorna (início a baixar, fim a baixar, data do pregão de sobreposição ou None).
+    """
+    if cached is None or cached.empty:
+        return range_start, range_end, None
+    if range_start >= covered_end:
+        before = cached.index[cached.index < covered_end]
+        if len(before):
+            return min(range_start, before[-1].normalize()), range_end, before[-1]
+    elif range_end <= covered_start:
+        first = cached.index[0]
+        return range_start, max(range_end, first.normalize() + pd.Timedelta(days=1)), first
+    return range_start, range_end, None
+
+
+def adjustment_changed(cached, new_data, overlap_date, tolerance=ADJUSTMENT_TOLERANCE):
+    """
+    True se o fechamento do pregão overlap_date mudou entre o cache e o novo download, ou
+    seja, o provedor reajustou a série (desdobramento, provento) e o cache está noutra base.
+    Sem o pregão no novo download não há como comparar: False.
+    """
+    if overlap_date is None or new_data is None or overlap_date not in new_data.index:
+        return False
+    old = float(cached.loc[overlap_date, 'Close'])
+    new = float(new_data.loc[overlap_date, 'Close'])
+    return abs(new - old) > tolerance * abs(old)
+
+
+def discard_cached_close(ticker, cache_dir=None):
+    """Apaga o cache de um ticker (ex.: série reajustada pelo provedor)."""
+    try:
+        os.remove(cache_path(ticker, cache_dir))
+    except FileNotFoundError:
+        pass
+
+
+def merge_close(cached, new_data):
+    """
+    Junta a série em cache com dados recém-baixados.
+    Em datas repetidas prevalece o dado novo (ex.: pregão do dia ainda em andamento).
+    """
+    frames = [frame for frame in (cached, new_data) if frame is not None and not frame.empty]
+    if not frames:
+        return cached if cached is not None else new_data
+    merged = pd.concat(frames)
+    merged = merged[~merged.index.duplicated(keep='last')]
+    return merged.sort_index()
+
+
+def coverage_end_limit():
+    """
+    Limite superior do intervalo marcado como coberto: hoje.
+    O pregão de hoje pode estar incompleto, então [hoje, ...) é sempre baixado novamente.
+    """
+    return pd.Timestamp(date.today())
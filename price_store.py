@@ -0,0 +1,241 @@
+# price_store.py
+
+import argparse
+import json
+import os
+import sys
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import price_cache
+
+# Diretório do armazenamento colunar compartilhado. Sem a variável de ambiente
+# LOG_RET_PRICE_STORE o armazenamento fica desligado e get_stock_data usa só o cache Parquet.
+DEFAULT_STORE_DIR = os.environ.get('LOG_RET_PRICE_STORE')
+
+# O manifesto aponta para os arquivos da versão atual. Cada reconstrução grava arquivos
+# novos e só então troca o manifesto (os.replace), então leitores já abertos continuam
+# vendo a versão antiga, intacta, até reabrirem.
+_MANIFEST = 'manifest.json'
+
+
+def build_price_store(prices, store_dir=None, coverage=None):
+    """
+    Grava um DataFrame largo de fechamentos (datas × tickers, NaN onde não houve pregão)
+    no armazenamento colunar: uma matriz float64 em ordem de coluna (cada ticker contíguo
+    no disco), o eixo de datas e o índice de tickers.
+    coverage opcional: {ticker: (início coberto, fim coberto)}, com a mesma semântica do
+    cache de preços; por padrão vai da primeira data até o dia seguinte à última.
+    Retorna o diretório gravado.
+    """
+    store_dir = store_dir or DEFAULT_STORE_DIR
+    if not store_dir:
+        raise ValueError("Diretório do armazenamento de preços não informado (LOG_RET_PRICE_STORE).")
+    os.makedirs(store_dir, exist_ok=True)
+
+    prices = prices.sort_index()
+    dates = pd.to_datetime(prices.index).to_numpy(dtype='datetime64[ns]')
+    tickers = [str(ticker).upper() for ticker in prices.columns]
+    if len(set(tickers)) != len(tickers):
+        raise ValueError("Tickers repetidos no DataFrame de preços.")
+
+    version = uuid.uuid4().hex[:12]
+    values_file = f"close-{version}.f64"
+    dates_file = f"dates-{version}.npy"
+
+    values = np.memmap(os.path.join(store_dir, values_file), dtype=np.float64, mode='w+',
+                       shape=(len(dates), len(tickers)), order='F')
+    # Coluna a coluna para não materializar a matriz inteira em memória
+    for position, column in enumerate(prices.columns):
+        values[:, position] = prices[column].to_numpy(dtype=np.float64)
+    values.flush()
+    del values
+    np.save(os.path.join(store_dir, dates_file), dates)
+
+    default_coverage = (
+        (pd.Timestamp(dates[0]).isoformat(), (pd.Timestamp(dates[-1]) + pd.Timedelta(days=1)).isoformat())
+        if len(dates) else (None, None)
+    )
+    coverage = {str(ticker).upper(): value for ticker, value in (coverage or {}).items()}
+    manifest = {
+        'version': version,
+        'values_file': values_file,
+        'dates_file': dates_file,
+        'shape': [len(dates), len(tickers)],
+        'tickers': tickers,
+        'coverage': {
+            ticker: [pd.Timestamp(value).isoformat() for value in coverage[ticker]] if ticker in coverage else list(default_coverage)
+            for ticker in tickers
+        },
+    }
+    manifest_path = os.path.join(store_dir, _MANIFEST)
+    tmp_path = price_cache.temporary_path(manifest_path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+    # Arquivos de versões anteriores: no Linux quem ainda os tem mapeados continua lendo normalmente
+    for name in os.listdir(store_dir):
+        if name.startswith(('close-', 'dates-')) and name not in (values_file, dates_file):
+            try:
+                os.remove(os.path.join(store_dir, name))
+            except OSError:
+                pass
+    return store_dir
+
+
+def build_price_store_from_cache(tickers, store_dir=None, cache_dir=None):
+    """
+    Monta o armazenamento a partir do cache Parquet por ticker (price_cache), alinhando
+    todas as séries num eixo de datas comum. Tickers sem cache são ignorados com aviso.
+    """
+    columns = {}
+    coverage = {}
+    for ticker in dict.fromkeys(ticker.upper() for ticker in tickers):
+        cached, covered_start, covered_end, _ = price_cache.load_cached_close(ticker, cache_dir)
+        if cached is None or cached.empty:
+            print(f"Aviso: '{ticker}' não está no cache de preços e ficará fora do armazenamento.")
+            continue
+        columns[ticker] = cached['Close']
+        coverage[ticker] = (covered_start, covered_end)
+    if not columns:
+        print("Erro: nenhum ticker do cache de preços para montar o armazenamento.")
+        return None
+    prices = pd.DataFrame(columns).sort_index()
+    return build_price_store(prices, store_dir, coverage)
+
+
+class PriceStore:
+    """
+    Leitura do armazenamento colunar por mapeamento de memória (somente leitura).
+    As páginas ficam no cache do sistema operacional e são compartilhadas por todos os
+    processos que abrem o mesmo diretório. Recortes por ticker e por intervalo de datas
+    são vistas dos arquivos mapeados, sem leitura nem cópia prévia.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or DEFAULT_STORE_DIR
+        manifest_path = os.path.join(self.store_dir, _MANIFEST)
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.manifest_mtime = os.stat(manifest_path).st_mtime_ns
+        self.version = manifest['version']
+        n_dates, n_tickers = manifest['shape']
+        self.tickers = manifest['tickers']
+        self._positions = {ticker: position for position, ticker in enumerate(self.tickers)}
+        self._coverage = {
+            ticker: (pd.Timestamp(start), pd.Timestamp(end))
+            for ticker, (start, end) in manifest['coverage'].items() if start is not None
+        }
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(self.store_dir, manifest['dates_file']), mmap_mode='r'), name='Date')
+        if len(self.dates) != n_dates:
+            raise ValueError(f"Armazenamento de preços inconsistente em '{self.store_dir}'.")
+        self.values = np.memmap(os.path.join(self.store_dir, manifest['values_file']), dtype=np.float64,
+                                mode='r', shape=(n_dates, n_tickers), order='F')
+
+    def __contains__(self, ticker):
+        return ticker.upper() in self._positions
+
+    def covers(self, ticker, start, end):
+        """Indica se o intervalo [start, end) do ticker está inteiro no armazenamento."""
+        coverage = self._coverage.get(ticker.upper())
+        return coverage is not None and coverage[0] <= pd.Timestamp(start) and pd.Timestamp(end) <= coverage[1]
+
+    def _rows(self, start, end):
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start))
+        last = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end))
+        return slice(first, last)
+
+    def series(self, ticker, start=None, end=None):
+        """
+        Fechamentos do ticker em [start, end) como Series sobre o arquivo mapeado (sem cópia).
+        Datas em que o ticker não teve pregão aparecem como NaN.
+        """
+        rows = self._rows(start, end)
+        return pd.Series(self.values[rows, self._positions[ticker.upper()]], index=self.dates[rows],
+                         name='Close', copy=False)
+
+    def frame(self, tickers=None, start=None, end=None):
+        """
+        DataFrame largo (datas × tickers) em [start, end), pronto para calculate_log_regression_batch.
+        Sem tickers (ou com um bloco contíguo deles) é uma vista do arquivo; uma seleção
+        arbitrária de tickers é copiada.
+        """
+        rows = self._rows(start, end)
+        if tickers is None:
+            columns, names = slice(None), self.tickers
+        else:
+            names = [ticker.upper() for ticker in tickers]
+            positions = [self._positions[ticker] for ticker in names]
+            contiguous = positions == list(range(positions[0], positions[0] + len(positions))) if positions else False
+            columns = slice(positions[0], positions[0] + len(positions)) if contiguous else positions
+        frame = pd.DataFrame(self.values[rows, columns], index=self.dates[rows],
+                             columns=pd.Index(names, name='Ticker'), copy=False)
+        return frame
+
+    def stock_data(self, ticker, start=None, end=None):
+        """
+        Mesmo formato de get_stock_data (DataFrame com a coluna 'Close', sem NaNs).
+        Continua sendo uma vista quando o ticker tem pregão em todas as datas do recorte.
+        """
+        close = self.series(ticker, start, end)
+        values = close.to_numpy()
+        if np.isnan(values).any():
+            close = close[~np.isnan(values)]
+        return pd.DataFrame({'Close': close}, copy=False)
+
+
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+
+
+def open_price_store(store_dir=None):
+    """
+    PriceStore do diretório, aberto uma vez por processo e reaberto quando o manifesto muda
+    (reconstrução). Retorna None se o armazenamento não estiver configurado ou não existir.
+    """
+    store_dir = store_dir or DEFAULT_STORE_DIR
+    if not store_dir:
+        return None
+    manifest_path = os.path.join(store_dir, _MANIFEST)
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except OSError:
+        return None
+    with _open_stores_lock:
+        store = _open_stores.get(store_dir)
+        if store is None or store.manifest_mtime != mtime:
+            try:
+                store = PriceStore(store_dir)
+            except Exception as e:
+                print(f"Aviso: armazenamento de preços ilegível em '{store_dir}': {e}")
+                return None
+            _open_stores[store_dir] = store
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monta o armazenamento colunar de preços a partir do cache Parquet.")
+    parser.add_argument('tickers_file', help="Arquivo com um ticker por linha.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Diretório do armazenamento (padrão: LOG_RET_PRICE_STORE).")
+    parser.add_argument('--cache-dir', default=None, help="Diretório do cache Parquet (padrão: LOG_RET_CACHE_DIR).")
+    args = parser.parse_args(argv)
+    if not args.store:
+        print("Erro: informe --store ou defina LOG_RET_PRICE_STORE.")
+        return 2
+
+    with open(args.tickers_file, encoding='utf-8') as f:
+        tickers = [line.split('#', 1)[0].strip() for line in f]
+    store_dir = build_price_store_from_cache([ticker for ticker in tickers if ticker], args.store, args.cache_dir)
+    if store_dir is None:
+        return 1
+    store = PriceStore(store_dir)
+    print(f"Armazenamento gravado em {store_dir}: {len(store.dates)} datas × {len(store.tickers)} tickers.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
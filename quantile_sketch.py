@@ -0,0 +1,126 @@
+# quantile_sketch.py
+
+import numpy as np
+
+
+class KLLSketch:
+    """
+    Sketch de quantis KLL (Karnin, Lang e Liberty), mesclável e de memória limitada.
+
+    Guarda uma pilha de compactadores: os itens do nível h valem 2^h observações cada.
+    Quando um nível passa da sua capacidade, ele é ordenado e metade dos itens (os de
+    posição par ou ímpar, ao acaso) sobe para o nível seguinte. A memória fica em
+    O(k log(n / k)) e o erro de posto típico em torno de 1,7 / k (k=200: ~1% do posto).
+
+    update aceita arrays inteiros (vetorizado) e merge combina sketches de pedaços
+    diferentes da mesma série — de blocos, de processos ou de arquivos — sem reler os dados.
+    """
+
+    # Razão entre as capacidades de níveis vizinhos (níveis mais baixos são menores)
+    _CAPACITY_RATIO = 2 / 3
+
+    def __init__(self, k=200, seed=None):
+        if k < 8:
+            raise ValueError("k deve ser pelo menos 8.")
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, level):
+        depth = len(self._levels) - 1 - level
+        return max(2, int(np.ceil(self.k * self._CAPACITY_RATIO ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                # Com número ímpar de itens, o último fica neste nível
+                keep = items[len(items) - len(items) % 2:]
+                promoted = items[self._rng.integers(2):len(items) - len(items) % 2:2]
+                self._levels[level] = keep
+                self._levels[level + 1] = np.concatenate((self._levels[level + 1], promoted))
+            level += 1
+
+    def update(self, values):
+        """Acrescenta observações (escalar ou array; NaNs são ignorados)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._levels[0] = np.concatenate((self._levels[0], values))
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Incorpora outro sketch (o resultado resume a união das duas séries de observações)."""
+        if other.n == 0:
+            return self
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate((self._levels[level], items))
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, quantiles):
+        """Quantis aproximados (array na ordem de quantiles); 0 e 1 retornam o mínimo e o máximo exatos."""
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        if self.n == 0:
+            return np.full(quantiles.shape, np.nan)
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self._levels)])
+        order = np.argsort(items)
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, quantiles * cumulative[-1], side='left')
+        result = items[np.minimum(positions, len(items) - 1)]
+        result = np.where(quantiles <= 0, self.min, result)
+        return np.where(quantiles >= 1, self.max, result)
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def rank(self, value):
+        """Fração aproximada das observações abaixo de value (empates contam pela metade)."""
+        if self.n == 0:
+            return np.nan
+        below = equal = 0.0
+        for level, items in enumerate(self._levels):
+            below += 2.0 ** level * np.count_nonzero(items < value)
+            equal += 2.0 ** level * np.count_nonzero(items == value)
+        return (below + 0.5 * equal) / sum(2.0 ** level * len(items) for level, items in enumerate(self._levels))
+
+    def to_dict(self):
+        """Estado serializável em JSON."""
+        return {
+            'k': self.k,
+            'n': self.n,
+            'min': float(self.min) if self.n else None,
+            'max': float(self.max) if self.n else None,
+            'levels': [items.tolist() for items in self._levels],
+        }
+
+    @classmethod
+    def from_dict(cls, state, seed=None):
+        sketch = cls(state['k'], seed)
+        sketch.n = state['n']
+        if state['n']:
+            sketch.min, sketch.max = state['min'], state['max']
+        sketch._levels = [np.asarray(items, dtype=np.float64) for items in state['levels']]
+        return sketch
@@ -0,0 +1,129 @@
+# result_cache.py
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_nbytes(obj, _seen=None):
+    """
+    Estimativa do tamanho em memória de um resultado de análise.
+    Conta DataFrames/Series/arrays pelo tamanho real dos dados e percorre dicts, listas,
+    tuplas e objetos com __slots__; demais objetos entram com sys.getsizeof.
+    """
+    _seen = _seen if _seen is not None else set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(k, _seen) + estimate_nbytes(v, _seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(item, _seen) for item in obj)
+    slots = getattr(type(obj), '__slots__', None)
+    if slots:
+        return sys.getsizeof(obj) + sum(estimate_nbytes(getattr(obj, name, None), _seen) for name in slots)
+    return sys.getsizeof(obj)
+
+
+class ResultCache:
+    """
+    Cache em memória, compartilhado pelo processo inteiro e seguro entre threads,
+    com expulsão por LRU, por idade (ttl em segundos) e por memória total estimada.
+    Requisições simultâneas pela mesma chave calculam o resultado uma única vez.
+    """
+
+    def __init__(self, max_entries=256, ttl=900, max_bytes=512 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # chave -> (expira_em, tamanho, valor)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            if nbytes > self.max_bytes:
+                # Um único resultado maior que o limite nunca fica residente
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, nbytes, value)
+            self._total_bytes += nbytes
+            self._evict()
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        """
+        Retorna o valor em cache para key ou o calcula com compute().
+        should_cache(valor) decide se o resultado calculado é guardado (ex.: não guardar erros).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Outra thread pode ter calculado enquanto esperávamos
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                if value is not None and (should_cache is None or should_cache(value)):
+                    self.set(key, value)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total_bytes}
+
+    def _pop(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._total_bytes -= nbytes
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _, _) in self._entries.items() if expires_at < now]:
+            self._pop(key)
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            self._pop(next(iter(self._entries)))
+
+
+# Instância única por processo: o Streamlit reexecuta app.py a cada interação, mas os módulos
+# importados permanecem carregados, então todas as sessões compartilham este cache.
+# Limites configuráveis por variáveis de ambiente.
+shared_cache = ResultCache(
+    max_entries=int(os.environ.get('LOG_RET_RESULT_CACHE_MAX_ENTRIES', 256)),
+    ttl=float(os.environ.get('LOG_RET_RESULT_CACHE_TTL', 900)),
+    max_bytes=int(float(os.environ.get('LOG_RET_RESULT_CACHE_MAX_MB', 512)) * 1024 ** 2),
+)
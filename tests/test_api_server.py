@@ -0,0 +1,17 @@
+# tests/test_api_server.py
+
+import pytest
+
+pytest.importorskip('tornado')
+
+import api_server
+
+
+def test_etag_changes_with_intraday_values():
+    summary = {
+        'ticker': 'PETR4.SA', 'start_date': '2021-01-01', 'end_date': '2026-12-31', 'status': 'ok',
+        'last_date': '2026-10-16', 'n_obs': 1200, 'current_actual_price': 38.5, 'slope': 0.0004,
+    }
+    intraday = dict(summary, current_actual_price=38.9, slope=0.00041)
+    assert api_server._etag([summary]) == api_server._etag([dict(summary)])
+    assert api_server._etag([summary]) != api_server._etag([intraday])
@@ -0,0 +1,24 @@
+# tests/test_batch_cli.py
+
+import numpy as np
+import pytest
+
+import batch_cli
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+def test_completed_tickers_survive_na_like_names(tmp_path, output_format):
+    rows = [
+        {'ticker': 'NA', 'status': 'ok', 'slope': 0.001, 'channel_position': np.nan},
+        {'ticker': 'NULL', 'status': 'no_data', 'slope': np.nan, 'channel_position': np.nan},
+        {'ticker': 'PETR4.SA', 'status': 'ok', 'slope': 0.002, 'channel_position': 0.5},
+    ]
+    batch_cli.write_part(rows, str(tmp_path), output_format, 'part-0')
+
+    assert batch_cli.completed_tickers(str(tmp_path), output_format) == {'NA', 'NULL', 'PETR4.SA'}
+    assert batch_cli.completed_tickers(str(tmp_path), output_format, retry_failed=True) == {'NA', 'PETR4.SA'}
+
+    summary = batch_cli._read_part(batch_cli.consolidate(str(tmp_path), output_format), output_format)
+    assert list(summary['ticker']) == ['NA', 'NULL', 'PETR4.SA']
+    assert summary['slope'].dtype == np.float64
+    assert summary['channel_position'].isna().sum() == 2
@@ -0,0 +1,91 @@
+# tests/test_data_providers.py
+
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis_module
+import data_providers
+import price_cache
+
+yf = pytest.importorskip('yfinance')
+
+TICKERS = [f"T{i}" for i in range(8)]
+
+
+def _ticker_price(ticker):
+    """Preço constante e distinto por ticker, para reconhecer dados trocados."""
+    return 10.0 + TICKERS.index(ticker)
+
+
+@pytest.fixture
+def yahoo_stub(monkeypatch, tmp_path):
+    """Ticker.history e yf.download falsos, com atrasos aleatórios para provocar sobreposição."""
+    monkeypatch.setattr(price_cache, 'DEFAULT_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('LOG_RET_DATA_DIR', raising=False)
+    monkeypatch.delenv('LOG_RET_PRICE_STORE', raising=False)
+    dates = pd.bdate_range('2024-01-01', '2024-03-01', tz='America/New_York', name='Date')
+    active = {'downloads': 0, 'max_downloads': 0}
+    lock = threading.Lock()
+
+    def history(self, start=None, end=None, **kwargs):
+        time.sleep(random.uniform(0, 0.02))
+        window = dates[(dates >= pd.Timestamp(start, tz=dates.tz)) & (dates < pd.Timestamp(end, tz=dates.tz))]
+        return pd.DataFrame({'Open': _ticker_price(self.ticker), 'Close': _ticker_price(self.ticker)}, index=window)
+
+    def download(tickers, start=None, end=None, **kwargs):
+        with lock:
+            active['downloads'] += 1
+            active['max_downloads'] = max(active['max_downloads'], active['downloads'])
+        time.sleep(random.uniform(0, 0.02))
+        with lock:
+            active['downloads'] -= 1
+        close = pd.DataFrame({ticker: _ticker_price(ticker) for ticker in tickers}, index=dates.tz_localize(None))
+        close.columns = pd.MultiIndex.from_product([['Close'], close.columns], names=['Price', 'Ticker'])
+        return close
+
+    monkeypatch.setattr(yf.Ticker, 'history', history)
+    monkeypatch.setattr(yf, 'download', download)
+    return active
+
+
+def test_concurrent_single_ticker_fetches_keep_their_own_data(yahoo_stub):
+    results = analysis_module.fetch_many(TICKERS, '2024-01-01', '2024-03-01', max_workers=8)
+    for ticker in TICKERS:
+        stock_data = results[ticker]['stock_data']
+        assert list(stock_data.columns) == ['Close'], ticker
+        assert len(stock_data) > 0
+        np.testing.assert_array_equal(stock_data['Close'].to_numpy(), _ticker_price(ticker))
+        assert analysis_module.calculate_log_regression(stock_data) is not None
+
+
+def test_concurrent_batch_downloads_are_serialized(yahoo_stub):
+    provider = data_providers.YahooProvider()
+    start, end = pd.Timestamp('2024-01-01'), pd.Timestamp('2024-03-01')
+    groups = [TICKERS[:4], TICKERS[4:], TICKERS[2:6], TICKERS[::2]]
+    threads = [threading.Thread(target=provider.fetch_history, args=(group, start, end)) for group in groups * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert yahoo_stub['max_downloads'] == 1
+
+
+def test_missing_prices_are_empty_and_other_errors_raise(monkeypatch):
+    provider = data_providers.YahooProvider()
+    start, end = pd.Timestamp('2024-01-06'), pd.Timestamp('2024-01-08')
+
+    def no_prices(self, **kwargs):
+        raise yf.exceptions.YFPricesMissingError(self.ticker, '(1d 2024-01-06 -> 2024-01-08)')
+    monkeypatch.setattr(yf.Ticker, 'history', no_prices)
+    assert provider.fetch_history('ABC', start, end).empty
+
+    def rate_limited(self, **kwargs):
+        raise yf.exceptions.YFRateLimitError()
+    monkeypatch.setattr(yf.Ticker, 'history', rate_limited)
+    with pytest.raises(data_providers.DataSourceError):
+        provider.fetch_history('ABC', start, end)
@@ -0,0 +1,67 @@
+# tests/test_log_regression.py
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis_module
+import benchmark
+
+
+@pytest.fixture(scope='module')
+def stock_data():
+    """Série sintética reprodutível com NaNs isolados e blocos de pregões faltantes."""
+    prices = benchmark.generate_gbm_prices(1500, seed=42, nan_fraction=0.02, gap_fraction=0.01)
+    data = prices.iloc[:, [0]].set_axis(['Close'], axis=1)
+    assert data['Close'].isna().any()
+    return data
+
+
+def test_numpy_engine_matches_statsmodels(stock_data):
+    pytest.importorskip('statsmodels')
+    fast = analysis_module.calculate_log_regression(stock_data, engine='numpy')
+    reference = analysis_module.calculate_log_regression(stock_data, engine='statsmodels')
+
+    assert len(fast) == len(reference) == stock_data['Close'].notna().sum()
+    for attribute in ('slope', 'intercept', 'max_log_residual', 'min_log_residual', 'current_log_residual'):
+        assert getattr(fast, attribute) == pytest.approx(getattr(reference, attribute), rel=1e-9, abs=1e-12), attribute
+    np.testing.assert_allclose(fast.residuals, reference.residuals, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(fast.model.params[['Intercept', 'time']], reference.model.params[['Intercept', 'time']], rtol=1e-9)
+
+
+def test_projection_matches_statsmodels(stock_data):
+    pytest.importorskip('statsmodels')
+    projections = []
+    for engine in ('numpy', 'statsmodels'):
+        regression = analysis_module.calculate_log_regression(stock_data, engine=engine)
+        projections.append(analysis_module.project_log_channel(
+            regression.model,
+            regression.max_log_residual,
+            regression.min_log_residual,
+            len(regression)
+        ))
+    fast, reference = projections
+    pd.testing.assert_index_equal(fast.index, reference.index)
+    pd.testing.assert_index_equal(fast.columns, reference.columns)
+    np.testing.assert_allclose(fast.to_numpy(), reference.to_numpy(), rtol=1e-9)
+
+
+@pytest.mark.skipif(os.environ.get('LOG_RET_IMPORT_TEST') != '1', reason="defina LOG_RET_IMPORT_TEST=1 (mede importações em processos novos)")
+def test_core_import_time():
+    """
+    Os módulos do núcleo importam sem as dependências pesadas e, com LOG_RET_IMPORT_MAX_MS,
+    dentro do tempo limite (medido com `python -X importtime` num processo novo por módulo).
+    """
+    max_ms = float(os.environ['LOG_RET_IMPORT_MAX_MS']) if os.environ.get('LOG_RET_IMPORT_MAX_MS') else None
+    problems = []
+    for module in benchmark.CORE_MODULES:
+        import_ms, packages = benchmark.measure_import_time(module)
+        loaded = [package for package in benchmark.HEAVY_MODULES if package in packages]
+        print(f"{module:<40} {import_ms:>12.1f} ms  {'pesados: ' + ', '.join(loaded) if loaded else ''}")
+        if loaded:
+            problems.append(f"{module} carrega {', '.join(loaded)} na importação")
+        if max_ms is not None and import_ms > max_ms:
+            problems.append(f"{module} leva {import_ms:.0f} ms para importar (limite {max_ms:.0f} ms)")
+    assert not problems, '\n'.join(problems)
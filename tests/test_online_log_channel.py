@@ -0,0 +1,53 @@
+# tests/test_online_log_channel.py
+
+import json
+
+import pytest
+
+import analysis_module
+import benchmark
+
+
+@pytest.fixture(scope='module')
+def stock_data():
+    prices = benchmark.generate_gbm_prices(400, seed=11, sigma=0.5)
+    return prices.iloc[:, [0]].set_axis(['Close'], axis=1)
+
+
+def _assert_matches(channel, regression):
+    assert channel.n == len(regression)
+    assert channel.slope == pytest.approx(regression.slope, rel=1e-9, abs=1e-12)
+    assert channel.intercept == pytest.approx(regression.intercept, rel=1e-9, abs=1e-12)
+    assert channel.max_log_residual == pytest.approx(regression.max_log_residual, rel=1e-9, abs=1e-12)
+    assert channel.min_log_residual == pytest.approx(regression.min_log_residual, rel=1e-9, abs=1e-12)
+    assert channel.current_log_residual == pytest.approx(regression.current_log_residual, rel=1e-9, abs=1e-12)
+
+
+def test_bar_by_bar_append_matches_full_refit(stock_data):
+    channel = analysis_module.OnlineLogChannel.from_data(stock_data.iloc[:2])
+    for end in range(3, len(stock_data) + 1):
+        bar = stock_data.iloc[end - 1]
+        channel.append(bar['Close'], stock_data.index[end - 1])
+        _assert_matches(channel, analysis_module.calculate_log_regression(stock_data.iloc[:end]))
+
+
+def test_update_appends_only_new_bars(stock_data):
+    channel = analysis_module.OnlineLogChannel.from_data(stock_data.iloc[:250])
+    assert channel.update(stock_data) == len(stock_data) - 250
+    assert channel.update(stock_data) == 0
+    _assert_matches(channel, analysis_module.calculate_log_regression(stock_data))
+
+
+def test_state_round_trip(stock_data, tmp_path):
+    channel = analysis_module.OnlineLogChannel.from_data(stock_data.iloc[:300])
+    restored = analysis_module.OnlineLogChannel.from_dict(json.loads(json.dumps(channel.to_dict())))
+    path = tmp_path / 'channel.json'
+    channel.save(str(path))
+    loaded = analysis_module.OnlineLogChannel.load(str(path))
+
+    for other in (restored, loaded):
+        assert other.last_date == channel.last_date
+        assert other.last_close == channel.last_close
+        # O estado restaurado continua a ser atualizado exatamente como o original
+        other.update(stock_data)
+        _assert_matches(other, analysis_module.calculate_log_regression(stock_data))
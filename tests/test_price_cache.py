@@ -0,0 +1,141 @@
+# tests/test_price_cache.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis_module
+import benchmark
+import price_cache
+
+
+class RecordingDownloader(benchmark.StubDownloader):
+    """StubDownloader que guarda os intervalos pedidos e pode falhar ou voltar vazio sob demanda."""
+
+    def __init__(self, prices):
+        super().__init__(prices)
+        self.ranges = []
+        self.fail = False
+        self.empty = False
+
+    def __call__(self, tickers, start_date, end_date):
+        self.ranges.append((pd.Timestamp(start_date), pd.Timestamp(end_date)))
+        if self.fail:
+            raise ConnectionError("limite de requisições")
+        data = super().__call__(tickers, start_date, end_date)
+        return data.iloc[:0] if self.empty else data
+
+
+@pytest.fixture(autouse=True)
+def no_price_store(monkeypatch):
+    monkeypatch.delenv('LOG_RET_PRICE_STORE', raising=False)
+
+
+@pytest.fixture
+def prices():
+    return benchmark.generate_gbm_prices(600, seed=7, start='2019-01-01').set_axis(['X'], axis=1)
+
+
+def _get(downloader, cache_dir, start, end):
+    return analysis_module.get_stock_data('X', start, end, downloader=downloader, cache_dir=str(cache_dir))
+
+
+def _expected(prices, start, end):
+    window = prices[(prices.index >= pd.Timestamp(start)) & (prices.index < pd.Timestamp(end))]
+    return window['X'].dropna()
+
+
+def test_head_and_tail_top_up_fetch_only_missing_ranges(prices, tmp_path):
+    downloader = RecordingDownloader(prices)
+    _get(downloader, tmp_path, '2019-06-01', '2019-09-01')
+    cached, _, _, _ = price_cache.load_cached_close('X', str(tmp_path))
+    first_bar, last_bar = cached.index[0], cached.index[-1]
+
+    downloader.ranges.clear()
+    data = _get(downloader, tmp_path, '2019-03-01', '2019-12-01')
+
+    # Cada complemento inclui um único pregão já em cache, para detectar reajustes
+    assert downloader.ranges == [
+        (pd.Timestamp('2019-03-01'), first_bar + pd.Timedelta(days=1)),
+        (last_bar, pd.Timestamp('2019-12-01')),
+    ]
+    assert data.index.is_unique
+    pd.testing.assert_series_equal(data['Close'], _expected(prices, '2019-03-01', '2019-12-01'),
+                                   check_names=False, check_freq=False)
+    _, covered_start, covered_end, _ = price_cache.load_cached_close('X', str(tmp_path))
+    assert (covered_start, covered_end) == (pd.Timestamp('2019-03-01'), pd.Timestamp('2019-12-01'))
+
+    downloader.ranges.clear()
+    _get(downloader, tmp_path, '2019-04-01', '2019-11-01')
+    assert downloader.ranges == []
+
+
+def test_empty_recent_tail_does_not_extend_coverage(tmp_path):
+    today = pd.Timestamp.today().normalize()
+    dates = pd.bdate_range(today - pd.Timedelta(days=120), today - pd.Timedelta(days=30))
+    prices = pd.DataFrame({'X': np.linspace(10, 20, len(dates))}, index=dates)
+    downloader = RecordingDownloader(prices)
+    _get(downloader, tmp_path, today - pd.Timedelta(days=120), today - pd.Timedelta(days=60))
+
+    # Só o pregão de sobreposição volta: nada prova que os dias recentes não tiveram pregão
+    data = _get(downloader, tmp_path, today - pd.Timedelta(days=120), today + pd.Timedelta(days=1))
+    assert data.index[-1] == dates[-1]
+    assert price_cache.load_cached_close('X', str(tmp_path))[2] == dates[-1] + pd.Timedelta(days=1)
+
+    downloader.empty = True
+    assert price_cache.proven_range(today - pd.Timedelta(days=5), today, pd.DataFrame()) is None
+    _get(downloader, tmp_path, today - pd.Timedelta(days=120), today + pd.Timedelta(days=1))
+    assert price_cache.load_cached_close('X', str(tmp_path))[2] == dates[-1] + pd.Timedelta(days=1)
+
+
+def test_failed_top_up_falls_back_to_cache(prices, tmp_path):
+    downloader = RecordingDownloader(prices)
+    cached = _get(downloader, tmp_path, '2019-03-01', '2019-06-01')
+
+    downloader.fail = True
+    data = _get(downloader, tmp_path, '2019-03-01', '2019-09-01')
+    pd.testing.assert_frame_equal(data, cached, check_freq=False)
+    _, covered_start, covered_end, _ = price_cache.load_cached_close('X', str(tmp_path))
+    assert (covered_start, covered_end) == (pd.Timestamp('2019-03-01'), pd.Timestamp('2019-06-01'))
+
+
+def test_readjusted_series_replaces_cache(prices, tmp_path):
+    downloader = RecordingDownloader(prices)
+    _get(downloader, tmp_path, '2019-03-01', '2019-06-01')
+
+    # Desdobramento 2:1 em 2019-07-01: o provedor passa a devolver o histórico anterior pela metade
+    adjusted = prices.copy()
+    adjusted.loc[adjusted.index < '2019-07-01', 'X'] /= 2
+    downloader.prices = adjusted
+    data = _get(downloader, tmp_path, '2019-03-01', '2019-09-01')
+    pd.testing.assert_series_equal(data['Close'], _expected(adjusted, '2019-03-01', '2019-09-01'),
+                                   check_names=False, check_freq=False)
+
+
+def test_expired_cache_is_ignored(prices, tmp_path):
+    downloader = RecordingDownloader(prices)
+    _get(downloader, tmp_path, '2019-03-01', '2019-06-01')
+    assert price_cache.load_cached_close('X', str(tmp_path))[0] is not None
+    assert price_cache.load_cached_close('X', str(tmp_path), max_age=pd.Timedelta(0))[0] is None
+
+
+def test_concurrent_saves_of_the_same_ticker(prices, tmp_path):
+    close = prices.rename(columns={'X': 'Close'}).dropna()
+    errors = []
+
+    def save():
+        try:
+            price_cache.save_cached_close('X', close, close.index[0], close.index[-1], str(tmp_path))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['X.parquet']
+    pd.testing.assert_frame_equal(price_cache.load_cached_close('X', str(tmp_path))[0], close, check_freq=False)
@@ -0,0 +1,74 @@
+# tests/test_quantile_sketch.py
+
+import json
+
+import numpy as np
+import pytest
+
+import analysis_module
+import benchmark
+from quantile_sketch import KLLSketch
+
+QUANTILES = np.array([0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999])
+
+
+def _max_rank_error(sketch, values):
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(QUANTILES)
+    lower = np.searchsorted(ordered, estimates, side='left') / len(ordered)
+    upper = np.searchsorted(ordered, estimates, side='right') / len(ordered)
+    # Distância do quantil pedido ao intervalo de postos ocupado pela estimativa
+    return np.max(np.maximum(0, np.maximum(lower - QUANTILES, QUANTILES - upper)))
+
+
+def test_merged_sketch_stays_within_rank_error():
+    rng = np.random.default_rng(0)
+    first = rng.standard_t(4, size=300_000)
+    second = rng.normal(1.0, 0.5, size=200_000)
+
+    left = KLLSketch(200, seed=1)
+    for chunk in np.array_split(first, 30):
+        left.update(chunk)
+    right = KLLSketch(200, seed=2).update(second)
+    merged = left.merge(right)
+
+    values = np.concatenate((first, second))
+    assert merged.n == len(values)
+    assert (merged.min, merged.max) == (values.min(), values.max())
+    assert _max_rank_error(merged, values) < 0.02
+    assert merged.rank(np.median(values)) == pytest.approx(0.5, abs=0.02)
+    # Memória limitada: poucos itens guardados para meio milhão de observações
+    assert sum(len(items) for items in merged._levels) < 10 * merged.k
+
+
+def test_state_round_trip_and_nan_handling():
+    sketch = KLLSketch(64, seed=3).update([np.nan, 1.0, 2.0, np.nan, 3.0])
+    assert sketch.n == 3
+    sketch.update(np.arange(10_000, dtype=np.float64))
+    restored = KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.n == sketch.n
+    np.testing.assert_array_equal(restored.quantiles(QUANTILES), sketch.quantiles(QUANTILES))
+    assert restored.quantile(0) == sketch.min and restored.quantile(1) == sketch.max
+    assert np.isnan(KLLSketch().quantile(0.5))
+
+
+def test_streaming_fit_matches_in_memory_fit():
+    prices = benchmark.generate_gbm_prices(5000, seed=9, nan_fraction=0.01)
+    data = prices.iloc[:, [0]].set_axis(['Close'], axis=1)
+    regression = analysis_module.calculate_log_regression(data)
+
+    streaming = analysis_module.calculate_log_regression_streaming(
+        lambda: (data.iloc[start:start + 700] for start in range(0, len(data), 700)), seed=0
+    )
+    assert streaming['n_obs'] == len(regression)
+    assert streaming['slope'] == pytest.approx(regression.slope, rel=1e-9)
+    assert streaming['intercept'] == pytest.approx(regression.intercept, rel=1e-9)
+    for field in ('max_log_residual', 'min_log_residual', 'current_log_residual', 'channel_position'):
+        assert streaming[field] == pytest.approx(getattr(regression, field), rel=1e-8, abs=1e-10), field
+
+    # Quantis e percentil aproximados: comparados em posto com os exatos
+    residuals = np.sort(regression.residuals)
+    for quantile in analysis_module.DEFAULT_BAND_QUANTILES:
+        estimate = streaming[f"band_p{quantile * 100:g}_log_residual"]
+        assert np.searchsorted(residuals, estimate) / len(residuals) == pytest.approx(quantile, abs=0.02)
+    assert streaming['residual_percentile'] == pytest.approx(regression.residual_percentile, abs=2.0)
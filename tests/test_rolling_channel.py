@@ -0,0 +1,68 @@
+# tests/test_rolling_channel.py
+
+import numpy as np
+import pytest
+
+import analysis_module
+import benchmark
+
+WINDOW = 250
+BAND_QUANTILES = (0.01, 0.05, 0.95, 0.99)
+
+
+@pytest.fixture(scope='module')
+def stock_data():
+    prices = benchmark.generate_gbm_prices(900, seed=5, nan_fraction=0.02)
+    return prices.iloc[:, [0]].set_axis(['Close'], axis=1)
+
+
+@pytest.fixture(scope='module')
+def rolling(stock_data):
+    # Blocos pequenos para que a comparação atravesse fronteiras entre blocos
+    original = analysis_module._ROLLING_BLOCK_ELEMENTS
+    analysis_module._ROLLING_BLOCK_ELEMENTS = 37 * WINDOW
+    try:
+        return analysis_module.rolling_log_channel(stock_data, WINDOW, band_quantiles=BAND_QUANTILES)
+    finally:
+        analysis_module._ROLLING_BLOCK_ELEMENTS = original
+
+
+def test_rolling_matches_per_window_refit(stock_data, rolling):
+    clean = stock_data.dropna()
+    assert len(rolling) == len(clean) - WINDOW + 1
+    for row in (0, 36, 37, len(rolling) // 2, len(rolling) - 1):
+        window = clean.iloc[row:row + WINDOW]
+        regression = analysis_module.calculate_log_regression(window)
+        expected = regression.to_frame(band_quantiles=BAND_QUANTILES).iloc[-1]
+        actual = rolling.iloc[row]
+        assert rolling.index[row] == window.index[-1]
+        assert actual['slope'] == pytest.approx(regression.slope, rel=1e-9, abs=1e-12)
+        for column in ('max_log_residual', 'min_log_residual', 'channel_position'):
+            assert actual[column] == pytest.approx(getattr(regression, column), rel=1e-8, abs=1e-10), (row, column)
+        assert actual['log_residual'] == pytest.approx(regression.current_log_residual, rel=1e-8, abs=1e-10)
+        columns = ['Close', 'predicted_close', 'upper_outer_channel', 'lower_outer_channel',
+                   'upper_inner_channel', 'lower_inner_channel', 'band_p1', 'band_p5', 'band_p95', 'band_p99']
+        np.testing.assert_allclose(actual[columns].to_numpy(dtype=np.float64), expected[columns].to_numpy(dtype=np.float64), rtol=1e-8)
+
+
+def test_band_quantiles_do_not_change_the_channel(stock_data, rolling):
+    plain = analysis_module.rolling_log_channel(stock_data, WINDOW)
+    np.testing.assert_allclose(rolling[plain.columns].to_numpy(), plain.to_numpy(), rtol=1e-12)
+
+
+def test_sweep_matches_refit_from_each_start(stock_data):
+    clean = stock_data.dropna()
+    sweep = analysis_module.sweep_start_dates(stock_data, min_points=10)
+    assert len(sweep) == len(clean) - 9
+    for start in (clean.index[0], clean.index[300], clean.index[-10]):
+        regression = analysis_module.calculate_log_regression(clean[clean.index >= start])
+        row = sweep.loc[start]
+        assert row['n_obs'] == len(regression)
+        assert row['slope'] == pytest.approx(regression.slope, rel=1e-9, abs=1e-12)
+        assert row['intercept'] == pytest.approx(regression.intercept, rel=1e-9)
+        assert row['current_log_residual'] == pytest.approx(regression.current_log_residual, rel=1e-8, abs=1e-10)
+
+    # Grade de datas: cada data cai no primeiro pregão nela ou depois dela
+    grid = analysis_module.sweep_start_dates(stock_data, start_dates=[clean.index[99] + np.timedelta64(1, 'h'), clean.index[200]])
+    assert list(grid.index) == [clean.index[100], clean.index[200]]
+    np.testing.assert_allclose(grid['slope'].to_numpy(), sweep.loc[grid.index, 'slope'].to_numpy(), rtol=1e-12)